@@ -0,0 +1,227 @@
+"""
+Compiled Risk Kernels
+Fused Numba kernels for the hot aggregation paths; Numba is optional and
+callers fall back to their NumPy implementations when it is not installed
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange, get_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, cache=True)
+    def _aggregate_counterparty_groups(codes, notional, scores, packed_flags, high_risk_mask, critical_risk_mask,
+                                       n_groups, n_chunks):
+        """
+        Reduce every per-counterparty metric in a single sweep over the trades
+
+        Each thread accumulates a private partial result over its chunk of rows;
+        partials are combined at the end so no accumulator is shared.
+
+        Args:
+            codes: Counterparty code per trade (0..n_groups-1)
+            notional: Trade notional
+            scores: Tuple of equally typed score arrays to average and max
+            packed_flags: Trade flags packed as bits of a uint8
+            high_risk_mask: High risk trade indicator
+            critical_risk_mask: Critical risk trade indicator
+            n_groups: Number of counterparty codes
+            n_chunks: Number of row chunks reduced in parallel
+
+        Returns:
+            Tuple of (exposure, trade_count, score_sums, score_counts, score_max,
+            group_flags, high_risk_trades, critical_risk_trades)
+        """
+        n_rows = codes.shape[0]
+        n_scores = len(scores)
+        chunk_size = (n_rows + n_chunks - 1) // n_chunks
+
+        exposure = np.zeros((n_chunks, n_groups))
+        trade_count = np.zeros((n_chunks, n_groups), dtype=np.int64)
+        score_sums = np.zeros((n_chunks, n_groups, n_scores))
+        score_counts = np.zeros((n_chunks, n_groups, n_scores), dtype=np.int64)
+        score_max = np.full((n_chunks, n_groups, n_scores), -np.inf)
+        group_flags = np.zeros((n_chunks, n_groups), dtype=np.uint8)
+        high_risk_trades = np.zeros((n_chunks, n_groups), dtype=np.int64)
+        critical_risk_trades = np.zeros((n_chunks, n_groups), dtype=np.int64)
+
+        for chunk in prange(n_chunks):
+            for i in range(chunk * chunk_size, min((chunk + 1) * chunk_size, n_rows)):
+                group = codes[i]
+                exposure[chunk, group] += notional[i]
+                trade_count[chunk, group] += 1
+                group_flags[chunk, group] |= packed_flags[i]
+                high_risk_trades[chunk, group] += high_risk_mask[i]
+                critical_risk_trades[chunk, group] += critical_risk_mask[i]
+                for j in range(n_scores):
+                    value = scores[j][i]
+                    # Skip missing scores like pandas' mean() and max()
+                    if value == value:
+                        score_sums[chunk, group, j] += value
+                        score_counts[chunk, group, j] += 1
+                        if value > score_max[chunk, group, j]:
+                            score_max[chunk, group, j] = value
+
+        combined_max = np.full((n_groups, n_scores), np.nan)
+        combined_flags = np.zeros(n_groups, dtype=np.uint8)
+        for group in range(n_groups):
+            for chunk in range(n_chunks):
+                combined_flags[group] |= group_flags[chunk, group]
+                for j in range(n_scores):
+                    if score_counts[chunk, group, j] > 0 and not combined_max[group, j] >= score_max[chunk, group, j]:
+                        combined_max[group, j] = score_max[chunk, group, j]
+
+        return (
+            exposure.sum(axis=0),
+            trade_count.sum(axis=0),
+            score_sums.sum(axis=0),
+            score_counts.sum(axis=0),
+            combined_max,
+            combined_flags,
+            high_risk_trades.sum(axis=0),
+            critical_risk_trades.sum(axis=0)
+        )
+
+    def aggregate_counterparty_groups(codes, notional, scores, packed_flags, high_risk_mask, critical_risk_mask, n_groups):
+        """
+        Reduce every per-counterparty metric in a single sweep over the trades, one
+        row chunk per Numba thread
+
+        The thread count is read here rather than inside the kernel: a call to
+        get_num_threads() is a dynamic global that stops Numba caching the kernel.
+        """
+        n_chunks = max(1, min(get_num_threads(), codes.shape[0]))
+        return _aggregate_counterparty_groups(
+            codes, notional, scores, packed_flags, high_risk_mask, critical_risk_mask, n_groups, n_chunks
+        )
+
+
+# Derived columns produced by compute_risk_scores, in output row order
+RISK_SCORE_COLUMNS = (
+    'credit_risk_score',
+    'credit_adjusted_exposure',
+    'collateral_quality_score',
+    'haircut_risk_score',
+    'specialness_risk_score',
+    'market_risk_score',
+    'encumbrance_risk_score',
+    'margin_call_risk_score',
+    'liquidity_risk_score',
+    'operational_risk_score',
+    'maturity_risk_score',
+    'term_risk_score',
+    'mild_stress_exposure',
+    'severe_stress_exposure',
+    'mild_stress_risk_score',
+    'severe_stress_risk_score',
+    'composite_risk_score'
+)
+
+
+if NUMBA_AVAILABLE:
+
+    def _compute_risk_scores(notional, rating_weight, liquidity_score, price_vol_pct, duration_years,
+                            haircut_pct, specialness_bp, encumbrance_days, mild_margin_call, severe_margin_call,
+                            wrong_way_flag, cross_ccy_flag, ccp_cleared_flag, days_to_maturity, open_repo_flag,
+                            constants):
+        """
+        Derive every numeric risk score of a trade in a single fused pass
+
+        The arithmetic mirrors RepoDataProcessor's _derive_* methods term for term,
+        including the clip to 1.0 (which leaves missing values missing).
+
+        Args:
+            notional ... open_repo_flag: Trade-level input columns as float64 arrays
+            constants: Tuple of (max_haircut_pct, max_specialness_bp, max_encumbrance_days,
+                max_mild_margin_call, max_severe_margin_call, max_term_days, mild_stress,
+                severe_stress, credit_weight, market_weight, liquidity_weight,
+                operational_weight, term_weight)
+
+        Returns:
+            Float32 array of shape (len(RISK_SCORE_COLUMNS), n_trades), one row per derived
+            column; scores are computed in float64 and rounded once when stored
+        """
+        (max_haircut, max_specialness, max_encumbrance, max_mild_margin, max_severe_margin, max_term,
+         mild_stress, severe_stress, credit_weight, market_weight, liquidity_weight,
+         operational_weight, term_weight) = constants
+
+        n_rows = notional.shape[0]
+        out = np.empty((len(RISK_SCORE_COLUMNS), n_rows), dtype=np.float32)
+
+        for i in prange(n_rows):
+            # Credit risk
+            credit = rating_weight[i] / 100
+            out[0, i] = credit
+            out[1, i] = notional[i] * (1 + credit)
+
+            # Market risk
+            quality = (
+                (liquidity_score[i] * 0.4) +
+                ((1 - price_vol_pct[i] / 100) * 0.3) +
+                ((duration_years[i] <= 5) * 0.3)
+            )
+            haircut = haircut_pct[i] / max_haircut
+            specialness = specialness_bp[i] / max_specialness
+            market = (1 - quality) * 0.4 + haircut * 0.3 + specialness * 0.3
+            out[2, i] = quality
+            out[3, i] = haircut
+            out[4, i] = specialness
+            out[5, i] = market
+
+            # Liquidity risk
+            encumbrance = encumbrance_days[i] / max_encumbrance
+            if encumbrance > 1.0:
+                encumbrance = 1.0
+            margin_call = (mild_margin_call[i] / max_mild_margin * 0.5) + (severe_margin_call[i] / max_severe_margin * 0.5)
+            if margin_call > 1.0:
+                margin_call = 1.0
+            liquidity = encumbrance * 0.6 + margin_call * 0.4
+            out[6, i] = encumbrance
+            out[7, i] = margin_call
+            out[8, i] = liquidity
+
+            # Operational risk
+            operational = wrong_way_flag[i] * 0.4 + cross_ccy_flag[i] * 0.3 + (1 - ccp_cleared_flag[i]) * 0.3
+            out[9, i] = operational
+
+            # Term risk
+            maturity = days_to_maturity[i] / max_term
+            if maturity > 1.0:
+                maturity = 1.0
+            term = maturity * 0.7 + open_repo_flag[i] * 0.3
+            out[10, i] = maturity
+            out[11, i] = term
+
+            # Stress testing
+            out[12, i] = notional[i] * mild_stress
+            out[13, i] = notional[i] * severe_stress
+            mild_stress_score = credit * mild_stress
+            if mild_stress_score > 1.0:
+                mild_stress_score = 1.0
+            severe_stress_score = credit * severe_stress
+            if severe_stress_score > 1.0:
+                severe_stress_score = 1.0
+            out[14, i] = mild_stress_score
+            out[15, i] = severe_stress_score
+
+            # Composite risk score
+            out[16, i] = (
+                credit * credit_weight +
+                market * market_weight +
+                liquidity * liquidity_weight +
+                operational * operational_weight +
+                term * term_weight
+            )
+
+        return out
+
+    # JIT-compiled (and disk-cached) variant, releasing the GIL so streaming stages overlap;
+    # _risk_kernels_build.py compiles the same function ahead of time into the
+    # risk_kernels_aot extension module
+    compute_risk_scores = njit(parallel=True, cache=True, nogil=True)(_compute_risk_scores)
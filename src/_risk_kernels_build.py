@@ -0,0 +1,25 @@
+"""
+Ahead-of-Time Build of the Risk Kernels
+Compiles the risk score derivation kernel into the risk_kernels_aot extension module,
+which RepoDataProcessor loads in preference to the JIT version so no process pays the
+JIT warmup. Run from the src directory: python _risk_kernels_build.py
+"""
+
+import os
+
+from numba.pycc import CC
+
+from _risk_kernels import _compute_risk_scores
+
+cc = CC('risk_kernels_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Fifteen float64 trade columns plus the 13 float constants, returning the float32 score block
+cc.export(
+    'compute_risk_scores',
+    'f4[:, :](' + ', '.join(['f8[:]'] * 15) + ', UniTuple(f8, 13))'
+)(_compute_risk_scores)
+
+if __name__ == '__main__':
+    cc.compile()
+    print(f"Compiled risk_kernels_aot into {cc.output_dir}")
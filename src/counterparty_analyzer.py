@@ -7,11 +7,38 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from _risk_kernels import NUMBA_AVAILABLE
+
+if NUMBA_AVAILABLE:
+    from _risk_kernels import aggregate_counterparty_groups
 
 logger = logging.getLogger(__name__)
 
+# Averaged per-counterparty metrics and the trade-level score they are taken from
+AVERAGED_SCORE_COLUMNS = {
+    'average_risk_score': 'composite_risk_score',
+    'credit_risk_score': 'credit_risk_score',
+    'market_risk_score': 'market_risk_score',
+    'liquidity_risk_score': 'liquidity_risk_score',
+    'operational_risk_score': 'operational_risk_score',
+    'term_risk_score': 'term_risk_score',
+    'haircut_risk_score': 'haircut_risk_score',
+    'specialness_risk_score': 'specialness_risk_score',
+    'encumbrance_risk_score': 'encumbrance_risk_score',
+    'margin_call_risk_score': 'margin_call_risk_score'
+}
+
 @dataclass
 class CounterpartyRiskProfile:
     """Data class for counterparty risk profile"""
@@ -36,12 +63,30 @@ class CounterpartyRiskAnalyzer:
     Analyzes counterparty risk by aggregating trade-level data
     """
     
-    def __init__(self, config: Dict):
-        """Initialize the analyzer with configuration"""
+    def __init__(self, config: Dict, use_polars: bool = False):
+        """Initialize the analyzer with configuration; use_polars aggregates counterparties with Polars"""
+        if use_polars and pl is None:
+            raise ImportError("polars is required for use_polars=True")
+        
         self.config = config
+        self.use_polars = use_polars
+        
+        # Resolve thresholds used on hot paths once instead of per lookup
+        score_thresholds = config['composite_risk']['score_thresholds']
+        self.high_risk_score_threshold = float(score_thresholds['high_risk'])
+        self.critical_risk_score_threshold = float(score_thresholds['critical_risk'])
+        self.concentration_limit_pct = float(config['credit_risk']['concentration']['single_counterparty_limit_pct'])
+        
+        # Counterparty count above which profiles are reduced on a thread pool, and
+        # trade count above which the fused Numba kernel pays off (it is compiled on
+        # first use and loaded from Numba's disk cache by later processes)
+        self.parallel_min_counterparties = 100
+        self.fused_kernel_min_trades = 500_000
+        
         self.counterparty_profiles = {}
         self.high_risk_counterparties = []
         self.risk_aggregates = {}
+        self.counterparty_table = pd.DataFrame()
         
     def analyze_counterparties(self, data: pd.DataFrame) -> Dict:
         """
@@ -55,20 +100,77 @@ class CounterpartyRiskAnalyzer:
         """
         logger.info("Starting counterparty risk analysis...")
         
-        # Group by counterparty type
-        counterparty_groups = data.groupby('counterparty_type')
+        # Encode low-cardinality string columns as categoricals so grouping and
+        # counting work on integer codes instead of hashing strings, and narrow the
+        # [0, 1] risk scores to float32 and the flags to bool to halve the bytes
+        # scanned by every reduction (notional stays float64)
+        column_dtypes = {
+            column: 'category'
+            for column in ('counterparty_type', 'risk_category', 'collateral_hqla_level', 'currency', 'jurisdiction')
+        }
+        column_dtypes.update({column: np.float32 for column in data.columns if column.endswith('_risk_score')})
+        column_dtypes.update({column: bool for column in data.columns if column.endswith('_flag')})
+        data = data.astype(column_dtypes)
+        
+        # Evaluate the high/critical risk masks once for the whole portfolio
+        composite_scores = data['composite_risk_score'].to_numpy()
+        notional = data['notional_musd'].to_numpy()
+        high_risk_mask = composite_scores > 0.7
+        critical_risk_mask = composite_scores > 0.9
+        
+        # Factorize counterparty types once; trades without a type are left out of
+        # the profiles, as groupby() drops missing keys
+        codes, counterparty_types = pd.factorize(data['counterparty_type'], sort=True)
+        grouped_data, grouped_high_risk, grouped_critical_risk = data, high_risk_mask, critical_risk_mask
+        keyed = codes >= 0
+        if not keyed.all():
+            grouped_data, codes = data[keyed], codes[keyed]
+            grouped_high_risk, grouped_critical_risk = high_risk_mask[keyed], critical_risk_mask[keyed]
+        
+        # Aggregate all per-counterparty metrics from the code vector; with many
+        # counterparties the per-group reductions are spread over a thread pool
+        if self.use_polars:
+            aggregate_metrics = self._aggregate_counterparty_metrics_polars
+        elif len(counterparty_types) >= self.parallel_min_counterparties:
+            aggregate_metrics = self._aggregate_counterparty_metrics_parallel
+        elif NUMBA_AVAILABLE and len(codes) >= self.fused_kernel_min_trades:
+            aggregate_metrics = self._aggregate_counterparty_metrics_fused
+        else:
+            aggregate_metrics = self._aggregate_counterparty_metrics
+        counterparty_metrics = aggregate_metrics(
+            grouped_data, codes, len(counterparty_types), grouped_high_risk, grouped_critical_risk
+        )
         
-        # Analyze each counterparty type
-        for counterparty_type, group_data in counterparty_groups:
-            profile = self._create_counterparty_profile(counterparty_type, group_data)
+        risk_categories = self._dominant_risk_categories(grouped_data, codes, len(counterparty_types))
+        
+        # Concentration ratio (percentage of total portfolio)
+        total_portfolio = notional.sum()
+        exposures = counterparty_metrics['total_exposure']
+        concentration_ratios = (exposures / total_portfolio * 100) if total_portfolio > 0 else np.zeros(len(exposures))
+        
+        # Build a profile for each counterparty type
+        for position, counterparty_type in enumerate(counterparty_types):
+            metrics = {name: values[position] for name, values in counterparty_metrics.items()}
+            profile = self._create_counterparty_profile(
+                counterparty_type, metrics, risk_categories[position],
+                concentration_ratios[position]
+            )
             self.counterparty_profiles[counterparty_type] = profile
-            
-            # Check if counterparty is high risk
-            if self._is_high_risk_counterparty(profile):
-                self.high_risk_counterparties.append(counterparty_type)
+        
+        # Check which counterparties are high risk in one vectorized pass
+        high_risk_counterparty_mask = self._identify_high_risk_counterparties(counterparty_metrics, concentration_ratios)
+        self.high_risk_counterparties.extend(counterparty_types[high_risk_counterparty_mask].tolist())
         
         # Calculate portfolio-level aggregates
-        self._calculate_portfolio_aggregates(data)
+        self._calculate_portfolio_aggregates(
+            data, notional, high_risk_mask, critical_risk_mask,
+            counterparty_metrics['total_exposure'], counterparty_types
+        )
+        
+        # Tabulate the profiles column-wise for exports
+        self.counterparty_table = self._build_counterparty_table(
+            counterparty_types, counterparty_metrics, risk_categories, concentration_ratios
+        )
         
         # Generate risk flags and recommendations
         risk_flags = self._generate_risk_flags(data)
@@ -84,155 +186,338 @@ class CounterpartyRiskAnalyzer:
         logger.info(f"Analysis completed. Found {len(self.high_risk_counterparties)} high-risk counterparties.")
         return analysis_results
     
-    def _create_counterparty_profile(self, counterparty_type: str, data: pd.DataFrame) -> CounterpartyRiskProfile:
-        """Create risk profile for a counterparty type"""
-        
-        # Basic metrics
-        total_exposure = data['notional_musd'].sum()
-        trade_count = len(data)
-        average_risk_score = data['composite_risk_score'].mean()
-        max_risk_score = data['composite_risk_score'].max()
-        
-        # Risk category (most common)
-        risk_category = data['risk_category'].mode().iloc[0] if len(data['risk_category'].mode()) > 0 else 'Medium'
-        
-        # Component risk scores
-        credit_risk_score = data['credit_risk_score'].mean()
-        market_risk_score = data['market_risk_score'].mean()
-        liquidity_risk_score = data['liquidity_risk_score'].mean()
-        operational_risk_score = data['operational_risk_score'].mean()
-        term_risk_score = data['term_risk_score'].mean()
+    def _aggregate_counterparty_metrics(self, data: pd.DataFrame, codes: np.ndarray, n_groups: int,
+                                        high_risk_mask: np.ndarray, critical_risk_mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """Reduce trade-level metrics to one value per counterparty code using bincount/reduceat"""
+        if n_groups == 0:
+            # reduceat needs at least one group start
+            return self._empty_counterparty_metrics()
+        
+        trade_count = np.bincount(codes, minlength=n_groups)
+        
+        def group_mean(column: str) -> np.ndarray:
+            values = data[column].to_numpy()
+            missing = np.isnan(values)
+            if missing.any():
+                # Skip missing scores like pandas' mean()
+                totals = np.bincount(codes, weights=np.where(missing, 0.0, values), minlength=n_groups)
+                return totals / np.bincount(codes, weights=~missing, minlength=n_groups)
+            return np.bincount(codes, weights=values, minlength=n_groups) / trade_count
+        
+        # Max and any() need contiguous groups, so reduce over the code-sorted rows
+        order = np.argsort(codes, kind='stable')
+        group_starts = np.r_[0, np.cumsum(trade_count)[:-1]]
+        composite_scores = data['composite_risk_score'].to_numpy()
+        
+        group_flags = np.bitwise_or.reduceat(self._pack_trade_flags(data)[order], group_starts)
         
-        # Concentration ratio (percentage of total portfolio)
-        total_portfolio = data['notional_musd'].sum()  # This will be recalculated at portfolio level
-        concentration_ratio = (total_exposure / total_portfolio * 100) if total_portfolio > 0 else 0
+        return {
+            'total_exposure': np.bincount(codes, weights=data['notional_musd'].to_numpy(dtype=np.float64), minlength=n_groups),
+            'trade_count': trade_count,
+            'average_risk_score': group_mean('composite_risk_score'),
+            'max_risk_score': np.fmax.reduceat(composite_scores[order], group_starts).astype(np.float64),
+            'credit_risk_score': group_mean('credit_risk_score'),
+            'market_risk_score': group_mean('market_risk_score'),
+            'liquidity_risk_score': group_mean('liquidity_risk_score'),
+            'operational_risk_score': group_mean('operational_risk_score'),
+            'term_risk_score': group_mean('term_risk_score'),
+            'high_risk_trades': np.bincount(codes, weights=high_risk_mask, minlength=n_groups).astype(np.int64),
+            'critical_risk_trades': np.bincount(codes, weights=critical_risk_mask, minlength=n_groups).astype(np.int64),
+            # Inputs to the per-counterparty risk flags
+            'haircut_risk_score': group_mean('haircut_risk_score'),
+            'specialness_risk_score': group_mean('specialness_risk_score'),
+            'encumbrance_risk_score': group_mean('encumbrance_risk_score'),
+            'margin_call_risk_score': group_mean('margin_call_risk_score'),
+            **self._unpack_group_flags(group_flags)
+        }
+    
+    def _empty_counterparty_metrics(self) -> Dict[str, np.ndarray]:
+        """Zero-length metric arrays for a portfolio without any trades that have a counterparty type"""
+        metrics = {name: np.empty(0) for name in (*AVERAGED_SCORE_COLUMNS, 'total_exposure', 'max_risk_score')}
+        metrics.update({
+            name: np.empty(0, dtype=np.int64) for name in ('trade_count', 'high_risk_trades', 'critical_risk_trades')
+        })
+        metrics.update(self._unpack_group_flags(np.empty(0, dtype=np.uint8)))
+        return metrics
+    
+    def _pack_trade_flags(self, data: pd.DataFrame) -> np.ndarray:
+        """Pack the boolean trade flags into one byte per trade so a single OR-reduction yields every any()"""
+        return (
+            data['high_risk_rating_flag'].to_numpy().astype(np.uint8) |
+            (data['wrong_way_risk_flag'].to_numpy().astype(np.uint8) << 1) |
+            (data['cross_ccy_flag'].to_numpy().astype(np.uint8) << 2)
+        )
+    
+    def _unpack_group_flags(self, group_flags: np.ndarray) -> Dict[str, np.ndarray]:
+        """Recover the per-counterparty any() of each packed trade flag"""
+        return {
+            'high_risk_rating_flag': (group_flags & 1) != 0,
+            'wrong_way_risk_flag': (group_flags & 2) != 0,
+            'cross_ccy_flag': (group_flags & 4) != 0
+        }
+    
+    def _aggregate_counterparty_metrics_fused(self, data: pd.DataFrame, codes: np.ndarray, n_groups: int,
+                                              high_risk_mask: np.ndarray, critical_risk_mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """Reduce trade-level metrics per counterparty code in one pass with the fused Numba kernel"""
+        scores = tuple(
+            data[column].to_numpy(dtype=np.float32) for column in AVERAGED_SCORE_COLUMNS.values()
+        )
+        (exposure, trade_count, score_sums, score_counts, score_max,
+         group_flags, high_risk_trades, critical_risk_trades) = aggregate_counterparty_groups(
+            codes, data['notional_musd'].to_numpy(dtype=np.float64), scores, self._pack_trade_flags(data),
+            high_risk_mask, critical_risk_mask, n_groups
+        )
         
-        # High risk trade counts
-        high_risk_trades = (data['composite_risk_score'] > 0.7).sum()
-        critical_risk_trades = (data['composite_risk_score'] > 0.9).sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            score_means = score_sums / score_counts
+        metrics = {name: score_means[:, j] for j, name in enumerate(AVERAGED_SCORE_COLUMNS)}
+        metrics.update({
+            'total_exposure': exposure,
+            'trade_count': trade_count,
+            'max_risk_score': score_max[:, 0],
+            'high_risk_trades': high_risk_trades,
+            'critical_risk_trades': critical_risk_trades,
+            **self._unpack_group_flags(group_flags)
+        })
+        return metrics
+    
+    def _aggregate_counterparty_metrics_parallel(self, data: pd.DataFrame, codes: np.ndarray, n_groups: int,
+                                                 high_risk_mask: np.ndarray, critical_risk_mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """Reduce trade-level metrics per counterparty code on a thread pool over code-sorted slices"""
+        if n_groups == 0:
+            return self._empty_counterparty_metrics()
+        
+        trade_count = np.bincount(codes, minlength=n_groups)
+        order = np.argsort(codes, kind='stable')
+        group_bounds = np.r_[0, np.cumsum(trade_count)]
+        
+        # Gather every input into counterparty order once so each group is a contiguous slice
+        sorted_scores = {name: data[column].to_numpy()[order] for name, column in AVERAGED_SCORE_COLUMNS.items()}
+        sorted_flags = {
+            column: data[column].to_numpy()[order]
+            for column in ('high_risk_rating_flag', 'wrong_way_risk_flag', 'cross_ccy_flag')
+        }
+        sorted_notional = data['notional_musd'].to_numpy(dtype=np.float64)[order]
+        sorted_high_risk = high_risk_mask[order]
+        sorted_critical_risk = critical_risk_mask[order]
+        
+        def reduce_group(position: int) -> Dict:
+            # NumPy releases the GIL inside these reductions, so groups run concurrently
+            group = slice(group_bounds[position], group_bounds[position + 1])
+            metrics = {name: np.nanmean(values[group], dtype=np.float64) for name, values in sorted_scores.items()}
+            metrics.update({name: values[group].any() for name, values in sorted_flags.items()})
+            metrics['total_exposure'] = sorted_notional[group].sum()
+            metrics['max_risk_score'] = np.float64(np.nanmax(sorted_scores['average_risk_score'][group]))
+            metrics['high_risk_trades'] = np.count_nonzero(sorted_high_risk[group])
+            metrics['critical_risk_trades'] = np.count_nonzero(sorted_critical_risk[group])
+            return metrics
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            group_metrics = list(executor.map(reduce_group, range(n_groups)))
+        
+        metrics = {name: np.array([group[name] for group in group_metrics]) for name in group_metrics[0]}
+        metrics['trade_count'] = trade_count
+        return metrics
+    
+    def _aggregate_counterparty_metrics_polars(self, data: pd.DataFrame, codes: np.ndarray, n_groups: int,
+                                               high_risk_mask: np.ndarray, critical_risk_mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """Reduce trade-level metrics per counterparty code with one lazy Polars group_by"""
+        trades = pl.DataFrame({
+            'code': codes,
+            'notional_musd': data['notional_musd'].to_numpy(dtype=np.float64),
+            'high_risk': high_risk_mask,
+            'critical_risk': critical_risk_mask,
+            **{column: data[column].to_numpy() for column in AVERAGED_SCORE_COLUMNS.values()},
+            **{column: data[column].to_numpy() for column in ('high_risk_rating_flag', 'wrong_way_risk_flag', 'cross_ccy_flag')}
+        })
+        
+        # NaN scores are turned into nulls so means and maxima skip them like pandas
+        aggregated = (
+            trades.lazy()
+            .group_by('code')
+            .agg([
+                pl.col('notional_musd').sum().alias('total_exposure'),
+                pl.len().cast(pl.Int64).alias('trade_count'),
+                pl.col('composite_risk_score').fill_nan(None).max().cast(pl.Float64).alias('max_risk_score'),
+                pl.col('high_risk').sum().cast(pl.Int64).alias('high_risk_trades'),
+                pl.col('critical_risk').sum().cast(pl.Int64).alias('critical_risk_trades'),
+                *[pl.col(column).fill_nan(None).cast(pl.Float64).mean().alias(name)
+                  for name, column in AVERAGED_SCORE_COLUMNS.items()],
+                *[pl.col(column).any() for column in ('high_risk_rating_flag', 'wrong_way_risk_flag', 'cross_ccy_flag')]
+            ])
+            .sort('code')
+            .collect()
+        )
         
+        return {name: aggregated[name].to_numpy() for name in aggregated.columns if name != 'code'}
+    
+    def _dominant_risk_categories(self, data: pd.DataFrame, codes: np.ndarray, n_groups: int) -> List[str]:
+        """Most common risk category per counterparty code, ties resolved in category order like mode()"""
+        categories = data['risk_category'].cat.categories
+        category_codes = data['risk_category'].cat.codes.to_numpy()
+        categorized = category_codes >= 0
+        
+        # Tabulate counterparty x category counts on the shared codes in one bincount
+        counts = np.bincount(
+            codes[categorized] * len(categories) + category_codes[categorized],
+            minlength=n_groups * len(categories)
+        ).reshape(n_groups, len(categories))
+        if counts.size == 0:
+            return ['Medium'] * n_groups
+        
+        dominant = np.asarray(categories, dtype=object)[counts.argmax(axis=1)]
+        return np.where(counts.any(axis=1), dominant, 'Medium').tolist()
+    
+    def _build_counterparty_table(self, counterparty_types: pd.Index, metrics: Dict[str, np.ndarray],
+                                  risk_categories: List[str], concentration_ratios: np.ndarray) -> pd.DataFrame:
+        """Build the counterparty profiles table directly from the aggregated metric arrays"""
+        return pd.DataFrame({
+            'counterparty_type': np.asarray(counterparty_types, dtype=object),
+            'total_exposure': metrics['total_exposure'],
+            'trade_count': metrics['trade_count'],
+            'average_risk_score': metrics['average_risk_score'],
+            'max_risk_score': metrics['max_risk_score'],
+            'risk_category': risk_categories,
+            'concentration_ratio': concentration_ratios,
+            'high_risk_trades': metrics['high_risk_trades'],
+            'critical_risk_trades': metrics['critical_risk_trades'],
+            'risk_flags': [', '.join(self.counterparty_profiles[counterparty_type].risk_flags)
+                           for counterparty_type in counterparty_types]
+        })
+    
+    def _create_counterparty_profile(self, counterparty_type: str, metrics: Dict, risk_category: str,
+                                     concentration_ratio: float) -> CounterpartyRiskProfile:
+        """Create risk profile for a counterparty type from its aggregated metrics"""
         # Generate risk flags
-        risk_flags = self._generate_counterparty_risk_flags(data, total_exposure, concentration_ratio)
+        risk_flags = self._generate_counterparty_risk_flags(metrics, concentration_ratio)
         
         return CounterpartyRiskProfile(
             counterparty_type=counterparty_type,
-            total_exposure=total_exposure,
-            trade_count=trade_count,
-            average_risk_score=average_risk_score,
-            max_risk_score=max_risk_score,
+            total_exposure=metrics['total_exposure'],
+            trade_count=metrics['trade_count'],
+            average_risk_score=metrics['average_risk_score'],
+            max_risk_score=metrics['max_risk_score'],
             risk_category=risk_category,
-            credit_risk_score=credit_risk_score,
-            market_risk_score=market_risk_score,
-            liquidity_risk_score=liquidity_risk_score,
-            operational_risk_score=operational_risk_score,
-            term_risk_score=term_risk_score,
+            credit_risk_score=metrics['credit_risk_score'],
+            market_risk_score=metrics['market_risk_score'],
+            liquidity_risk_score=metrics['liquidity_risk_score'],
+            operational_risk_score=metrics['operational_risk_score'],
+            term_risk_score=metrics['term_risk_score'],
             concentration_ratio=concentration_ratio,
-            high_risk_trades=high_risk_trades,
-            critical_risk_trades=critical_risk_trades,
+            high_risk_trades=metrics['high_risk_trades'],
+            critical_risk_trades=metrics['critical_risk_trades'],
             risk_flags=risk_flags
         )
     
-    def _is_high_risk_counterparty(self, profile: CounterpartyRiskProfile) -> bool:
-        """Determine if a counterparty is high risk based on multiple criteria"""
-        
-        # Check various risk thresholds
-        risk_criteria = [
-            profile.average_risk_score > self.config['composite_risk']['score_thresholds']['high_risk'],
-            profile.max_risk_score > self.config['composite_risk']['score_thresholds']['critical_risk'],
-            profile.concentration_ratio > self.config['credit_risk']['concentration']['single_counterparty_limit_pct'],
-            profile.high_risk_trades > profile.trade_count * 0.3,  # More than 30% high risk trades
-            profile.critical_risk_trades > 0,  # Any critical risk trades
-            profile.credit_risk_score > 0.7,
-            profile.market_risk_score > 0.7,
-            profile.liquidity_risk_score > 0.7
-        ]
+    def _identify_high_risk_counterparties(self, metrics: Dict[str, np.ndarray], concentration_ratios: np.ndarray) -> np.ndarray:
+        """Determine which counterparties are high risk based on multiple criteria"""
+        
+        # Count the risk thresholds each counterparty breaches
+        criteria_met = (
+            (metrics['average_risk_score'] > self.high_risk_score_threshold).astype(np.int8) +
+            (metrics['max_risk_score'] > self.critical_risk_score_threshold) +
+            (concentration_ratios > self.concentration_limit_pct) +
+            (metrics['high_risk_trades'] > metrics['trade_count'] * 0.3) +  # More than 30% high risk trades
+            (metrics['critical_risk_trades'] > 0) +  # Any critical risk trades
+            (metrics['credit_risk_score'] > 0.7) +
+            (metrics['market_risk_score'] > 0.7) +
+            (metrics['liquidity_risk_score'] > 0.7)
+        )
         
         # Counterparty is high risk if any 3 or more criteria are met
-        return sum(risk_criteria) >= 3
+        return criteria_met >= 3
     
-    def _generate_counterparty_risk_flags(self, data: pd.DataFrame, total_exposure: float, concentration_ratio: float) -> List[str]:
-        """Generate specific risk flags for a counterparty"""
+    def _generate_counterparty_risk_flags(self, metrics: Dict, concentration_ratio: float) -> List[str]:
+        """Generate specific risk flags for a counterparty from its aggregated metrics"""
         flags = []
         
         # Credit risk flags
-        if data['high_risk_rating_flag'].any():
+        if metrics['high_risk_rating_flag']:
             flags.append("HIGH_RISK_RATING")
         
-        if data['credit_risk_score'].mean() > 0.7:
+        if metrics['credit_risk_score'] > 0.7:
             flags.append("HIGH_CREDIT_RISK")
         
         # Market risk flags
-        if data['haircut_risk_score'].mean() > 0.8:
+        if metrics['haircut_risk_score'] > 0.8:
             flags.append("HIGH_HAIRCUT_RISK")
         
-        if data['specialness_risk_score'].mean() > 0.8:
+        if metrics['specialness_risk_score'] > 0.8:
             flags.append("HIGH_SPECIALNESS_RISK")
         
         # Liquidity risk flags
-        if data['encumbrance_risk_score'].mean() > 0.8:
+        if metrics['encumbrance_risk_score'] > 0.8:
             flags.append("HIGH_ENCUMBRANCE_RISK")
         
-        if data['margin_call_risk_score'].mean() > 0.8:
+        if metrics['margin_call_risk_score'] > 0.8:
             flags.append("HIGH_MARGIN_CALL_RISK")
         
         # Operational risk flags
-        if data['wrong_way_risk_flag'].any():
+        if metrics['wrong_way_risk_flag']:
             flags.append("WRONG_WAY_RISK")
         
-        if data['cross_ccy_flag'].any():
+        if metrics['cross_ccy_flag']:
             flags.append("CROSS_CURRENCY_RISK")
         
         # Concentration risk flags
-        if concentration_ratio > self.config['credit_risk']['concentration']['single_counterparty_limit_pct']:
+        if concentration_ratio > self.concentration_limit_pct:
             flags.append("HIGH_CONCENTRATION")
         
         # Term risk flags
-        if data['term_risk_score'].mean() > 0.8:
+        if metrics['term_risk_score'] > 0.8:
             flags.append("HIGH_TERM_RISK")
         
         return flags
     
-    def _calculate_portfolio_aggregates(self, data: pd.DataFrame):
+    def _calculate_portfolio_aggregates(self, data: pd.DataFrame, notional: np.ndarray,
+                                        high_risk_mask: np.ndarray, critical_risk_mask: np.ndarray,
+                                        counterparty_exposures: np.ndarray, counterparty_types: pd.Index):
         """Calculate portfolio-level risk aggregates"""
-        total_portfolio = data['notional_musd'].sum()
+        total_portfolio = notional.sum()
+        # Masked sums avoid materializing a filtered copy of the notional column
+        high_risk_exposure = np.sum(notional, where=high_risk_mask)
+        critical_risk_exposure = np.sum(notional, where=critical_risk_mask)
         
         self.risk_aggregates = {
             'total_portfolio_exposure': total_portfolio,
             'total_trades': len(data),
             'unique_counterparties': data['counterparty_type'].nunique(),
-            'portfolio_average_risk_score': data['composite_risk_score'].mean(),
-            'portfolio_max_risk_score': data['composite_risk_score'].max(),
-            'high_risk_exposure': data[data['composite_risk_score'] > 0.7]['notional_musd'].sum(),
-            'critical_risk_exposure': data[data['composite_risk_score'] > 0.9]['notional_musd'].sum(),
-            'high_risk_exposure_pct': (data[data['composite_risk_score'] > 0.7]['notional_musd'].sum() / total_portfolio * 100) if total_portfolio > 0 else 0,
-            'critical_risk_exposure_pct': (data[data['composite_risk_score'] > 0.9]['notional_musd'].sum() / total_portfolio * 100) if total_portfolio > 0 else 0,
-            'risk_distribution': data['risk_category'].value_counts().to_dict(),
-            'counterparty_concentration': self._calculate_concentration_metrics(data),
-            'collateral_quality_distribution': data['collateral_hqla_level'].value_counts().to_dict(),
-            'currency_distribution': data['currency'].value_counts().to_dict(),
-            'jurisdiction_distribution': data['jurisdiction'].value_counts().to_dict()
+            'portfolio_average_risk_score': float(data['composite_risk_score'].mean()),
+            'portfolio_max_risk_score': float(data['composite_risk_score'].max()),
+            'high_risk_exposure': high_risk_exposure,
+            'critical_risk_exposure': critical_risk_exposure,
+            'high_risk_exposure_pct': (high_risk_exposure / total_portfolio * 100) if total_portfolio > 0 else 0,
+            'critical_risk_exposure_pct': (critical_risk_exposure / total_portfolio * 100) if total_portfolio > 0 else 0,
+            'risk_distribution': self._category_distribution(data['risk_category']),
+            'counterparty_concentration': self._calculate_concentration_metrics(counterparty_exposures, counterparty_types),
+            'collateral_quality_distribution': self._category_distribution(data['collateral_hqla_level']),
+            'currency_distribution': self._category_distribution(data['currency']),
+            'jurisdiction_distribution': self._category_distribution(data['jurisdiction'])
         }
-        
-        # Update concentration ratios in profiles
-        for profile in self.counterparty_profiles.values():
-            profile.concentration_ratio = (profile.total_exposure / total_portfolio * 100) if total_portfolio > 0 else 0
     
-    def _calculate_concentration_metrics(self, data: pd.DataFrame) -> Dict:
-        """Calculate concentration risk metrics"""
-        counterparty_exposures = data.groupby('counterparty_type')['notional_musd'].sum().sort_values(ascending=False)
+    def _category_distribution(self, column: pd.Series) -> Dict:
+        """Count trades per category from the categorical codes, most common first like value_counts()"""
+        codes = column.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+        order = np.argsort(-counts, kind='stable')
+        return dict(zip(column.cat.categories[order].tolist(), counts[order].tolist()))
+    
+    def _calculate_concentration_metrics(self, counterparty_exposures: np.ndarray, counterparty_types: pd.Index) -> Dict:
+        """Calculate concentration risk metrics from per-counterparty exposures"""
         total_exposure = counterparty_exposures.sum()
+        order = np.argsort(-counterparty_exposures, kind='stable')
         
         # Top 5 counterparty concentration
-        top_5_concentration = (counterparty_exposures.head(5).sum() / total_exposure * 100) if total_exposure > 0 else 0
+        top_5_concentration = (counterparty_exposures[order[:5]].sum() / total_exposure * 100) if total_exposure > 0 else 0
         
         # Herfindahl-Hirschman Index (HHI) for concentration
-        hhi = ((counterparty_exposures / total_exposure) ** 2).sum() if total_exposure > 0 else 0
+        hhi = np.square(counterparty_exposures / total_exposure).sum() if total_exposure > 0 else 0
         
         return {
             'top_5_concentration_pct': top_5_concentration,
             'herfindahl_hirschman_index': hhi,
-            'largest_counterparty_pct': (counterparty_exposures.iloc[0] / total_exposure * 100) if total_exposure > 0 else 0,
-            'largest_counterparty': counterparty_exposures.index[0] if len(counterparty_exposures) > 0 else None
+            'largest_counterparty_pct': (counterparty_exposures[order[0]] / total_exposure * 100) if total_exposure > 0 else 0,
+            'largest_counterparty': counterparty_types[order[0]] if len(order) > 0 else None
         }
     
     def _generate_risk_flags(self, data: pd.DataFrame) -> Dict:
@@ -308,52 +593,39 @@ class CounterpartyRiskAnalyzer:
         if not self.high_risk_counterparties:
             return pd.DataFrame()
         
-        details = []
-        for counterparty in self.high_risk_counterparties:
-            profile = self.counterparty_profiles[counterparty]
-            details.append({
-                'counterparty_type': profile.counterparty_type,
-                'total_exposure': profile.total_exposure,
-                'trade_count': profile.trade_count,
-                'average_risk_score': profile.average_risk_score,
-                'max_risk_score': profile.max_risk_score,
-                'risk_category': profile.risk_category,
-                'concentration_ratio': profile.concentration_ratio,
-                'high_risk_trades': profile.high_risk_trades,
-                'critical_risk_trades': profile.critical_risk_trades,
-                'risk_flags': ', '.join(profile.risk_flags)
-            })
-        
-        return pd.DataFrame(details)
+        # Select the high-risk rows from the precomputed profiles table
+        is_high_risk = self.counterparty_table['counterparty_type'].isin(self.high_risk_counterparties)
+        return self.counterparty_table[is_high_risk].reset_index(drop=True)
+    
+    def _build_export_tables(self) -> Dict[str, pd.DataFrame]:
+        """Build the exported result tables keyed by sheet name"""
+        tables = {}
+        
+        # Summary sheet
+        tables['Portfolio_Summary'] = pd.DataFrame([self.risk_aggregates])
+        
+        # Counterparty profiles
+        tables['Counterparty_Profiles'] = self.counterparty_table
+        
+        # High risk counterparties
+        high_risk_df = self.get_high_risk_counterparties_details()
+        if not high_risk_df.empty:
+            tables['High_Risk_Counterparties'] = high_risk_df
+        
+        return tables
     
     def export_analysis_results(self, file_path: str):
         """Export analysis results to Excel file"""
         with pd.ExcelWriter(file_path, engine='xlsxwriter') as writer:
-            # Summary sheet
-            summary_df = pd.DataFrame([self.risk_aggregates])
-            summary_df.to_excel(writer, sheet_name='Portfolio_Summary', index=False)
-            
-            # Counterparty profiles
-            profiles_df = pd.DataFrame([
-                {
-                    'counterparty_type': profile.counterparty_type,
-                    'total_exposure': profile.total_exposure,
-                    'trade_count': profile.trade_count,
-                    'average_risk_score': profile.average_risk_score,
-                    'max_risk_score': profile.max_risk_score,
-                    'risk_category': profile.risk_category,
-                    'concentration_ratio': profile.concentration_ratio,
-                    'high_risk_trades': profile.high_risk_trades,
-                    'critical_risk_trades': profile.critical_risk_trades,
-                    'risk_flags': ', '.join(profile.risk_flags)
-                }
-                for profile in self.counterparty_profiles.values()
-            ])
-            profiles_df.to_excel(writer, sheet_name='Counterparty_Profiles', index=False)
-            
-            # High risk counterparties
-            high_risk_df = self.get_high_risk_counterparties_details()
-            if not high_risk_df.empty:
-                high_risk_df.to_excel(writer, sheet_name='High_Risk_Counterparties', index=False)
+            for sheet_name, table in self._build_export_tables().items():
+                table.to_excel(writer, sheet_name=sheet_name, index=False)
         
         logger.info(f"Analysis results exported to {file_path}")
+    
+    def export_analysis_results_parquet(self, output_dir: str):
+        """Export analysis results as one zstd-compressed Parquet file per sheet"""
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        for sheet_name, table in self._build_export_tables().items():
+            table.to_parquet(Path(output_dir) / f"{sheet_name.lower()}.parquet", compression='zstd', index=False)
+        
+        logger.info(f"Analysis results exported to {output_dir}")
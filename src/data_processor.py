@@ -5,35 +5,175 @@ Handles data loading, cleaning, and derivation of additional risk fields
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
 from datetime import datetime, timedelta
 import yaml
 from typing import Dict, List, Tuple, Optional
 import logging
+import os
+import copy
+from dataclasses import dataclass, astuple
+from functools import lru_cache, cached_property
+import threading
+from queue import Queue, Empty, Full
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+from _risk_kernels import NUMBA_AVAILABLE, RISK_SCORE_COLUMNS
+
+try:
+    # Ahead-of-time build (see _risk_kernels_build.py); loads without JIT warmup
+    from risk_kernels_aot import compute_risk_scores
+    FUSED_KERNEL_AVAILABLE = True
+except ImportError:
+    FUSED_KERNEL_AVAILABLE = NUMBA_AVAILABLE
+    if NUMBA_AVAILABLE:
+        from _risk_kernels import compute_risk_scores
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Date format of trade_date, parsed while reading the CSV
+TRADE_DATE_FORMAT = '%Y-%m-%d'
+
+# Column types of the repo trade file; columns not listed here are inferred
+TRADE_SCHEMA = pa.schema([
+    ('trade_id', pa.int64()),
+    ('trade_date', pa.timestamp('us')),
+    ('counterparty_type', pa.string()),
+    ('counterparty_rating', pa.string()),
+    ('notional_musd', pa.float64()),
+    ('haircut_pct', pa.float64()),
+    ('repo_rate_pct', pa.float64()),
+    ('collateral_liquidity_score', pa.float64()),
+    ('collateral_price_vol_20d_pct', pa.float64()),
+    ('collateral_duration_years', pa.float64()),
+    ('specialness_bp', pa.int64()),
+    ('encumbrance_days', pa.int64()),
+    ('margin_call_mild_musd', pa.float64()),
+    ('margin_call_severe_musd', pa.float64()),
+    ('wrong_way_risk_flag', pa.int64()),
+    ('cross_ccy_flag', pa.int64()),
+    ('ccp_cleared_flag', pa.int64()),
+    ('days_to_maturity', pa.int64()),
+    ('term_type', pa.string()),
+    ('collateral_hqla_level', pa.string()),
+    ('currency', pa.string()),
+    ('jurisdiction', pa.string())
+])
+
+# CSV conversion for trade files: fixed column types, empty text as missing, dates parsed on read
+TRADE_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types=TRADE_SCHEMA, strings_can_be_null=True, timestamp_parsers=[TRADE_DATE_FORMAT]
+)
+
+# Range validations as (flag column, column, lower comparison, lower bound, upper comparison, upper bound)
+VALID_RANGES = (
+    ('notional_valid', 'notional_musd', '>', 0, '<', 10000),
+    ('haircut_valid', 'haircut_pct', '>=', 0, '<=', 50),
+    ('repo_rate_valid', 'repo_rate_pct', '>=', -10, '<=', 50)
+)
+COMPARISONS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+
+# Low-cardinality text columns dictionary-encoded in Parquet output
+PARQUET_DICTIONARY_COLUMNS = ('counterparty_rating', 'counterparty_type', 'term_type', 'risk_category')
+
+@lru_cache(maxsize=4)
+def _read_yaml_config(config_path: str, modified_time: float) -> Dict:
+    """Parse a YAML config file; cached per path and modification time"""
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+@dataclass(frozen=True, slots=True)
+class RiskConsts:
+    """Numeric derivation constants, in the order compute_risk_scores expects them"""
+    max_haircut_pct: float
+    max_specialness_bp: float
+    max_encumbrance_days: float
+    max_mild_margin_call_musd: float
+    max_severe_margin_call_musd: float
+    max_term_days: float
+    mild_stress: float
+    severe_stress: float
+    credit_weight: float
+    market_weight: float
+    liquidity_weight: float
+    operational_weight: float
+    term_weight: float
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> 'RiskConsts':
+        """Resolve the constants from a risk threshold configuration"""
+        margin_calls = config['liquidity_risk']['margin_calls']
+        stress_factors = config['stress_testing']['stress_factors']
+        weights = config['composite_risk']['weights']
+        return cls(
+            max_haircut_pct=float(config['market_risk']['haircut']['max_haircut_pct']),
+            max_specialness_bp=float(config['market_risk']['specialness']['max_specialness_bp']),
+            max_encumbrance_days=float(config['liquidity_risk']['encumbrance']['max_encumbrance_days']),
+            max_mild_margin_call_musd=float(margin_calls['max_mild_margin_call_musd']),
+            max_severe_margin_call_musd=float(margin_calls['max_severe_margin_call_musd']),
+            max_term_days=float(config['term_risk']['maturity']['max_term_days']),
+            mild_stress=float(stress_factors['mild_stress']),
+            severe_stress=float(stress_factors['severe_stress']),
+            credit_weight=float(weights['credit_risk']),
+            market_weight=float(weights['market_risk']),
+            liquidity_weight=float(weights['liquidity_risk']),
+            operational_weight=float(weights['operational_risk']),
+            term_weight=float(weights['term_risk'])
+        )
+
+
 class RepoDataProcessor:
     """
     Processes repo trade data and derives additional risk fields
     """
     
-    def __init__(self, config_path: str = "../config/risk_thresholds.yaml"):
-        """Initialize the data processor with risk thresholds"""
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: str = "../config/risk_thresholds.yaml", config: Optional[Dict] = None):
+        """
+        Initialize the data processor with risk thresholds
+        
+        Args:
+            config_path: Path to the risk threshold YAML file
+            config: Already parsed risk threshold configuration, used instead of
+                reading config_path; copied so the caller's dict is never shared
+        """
+        self.config = copy.deepcopy(config) if config is not None else self._load_config(config_path)
         self.data = None
         self.processed_data = None
         
+        # Minimum trade count before the compiled derivation kernel is used
+        self.fused_kernel_min_trades = 100_000
+        
     def _load_config(self, config_path: str) -> Dict:
         """Load risk threshold configuration"""
         try:
-            with open(config_path, 'r') as file:
-                return yaml.safe_load(file)
+            config_path = os.path.abspath(config_path)
+            # Copy so callers can adjust their config without touching the cached one
+            return copy.deepcopy(_read_yaml_config(config_path, os.path.getmtime(config_path)))
         except FileNotFoundError:
             logger.warning(f"Config file {config_path} not found. Using default thresholds.")
             return self._get_default_config()
     
+    @cached_property
+    def risk_consts(self) -> RiskConsts:
+        """Numeric derivation constants, resolved from the config on first use"""
+        return RiskConsts.from_config(self.config)
+    
     def _get_default_config(self) -> Dict:
         """Return default configuration if file not found"""
         return {
@@ -56,7 +196,12 @@ class RepoDataProcessor:
         """Load repo trade data from CSV file"""
         try:
             logger.info(f"Loading data from {file_path}")
-            self.data = pd.read_csv(file_path)
+            table = pa_csv.read_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(use_threads=True, block_size=64 << 20),
+                convert_options=TRADE_CONVERT_OPTIONS
+            )
+            self.data = table.to_pandas(self_destruct=True)
             logger.info(f"Loaded {len(self.data)} records with {len(self.data.columns)} columns")
             return self.data
         except Exception as e:
@@ -70,8 +215,11 @@ class RepoDataProcessor:
         
         logger.info("Cleaning data...")
         
-        # Convert date columns
-        self.data['trade_date'] = pd.to_datetime(self.data['trade_date'])
+        # Dates are parsed by load_data; only frames built elsewhere still hold text here
+        if not pd.api.types.is_datetime64_any_dtype(self.data['trade_date']):
+            self.data['trade_date'] = pd.to_datetime(self.data['trade_date'])
+        
+        self.data['counterparty_rating'] = self._rating_categorical(self.data['counterparty_rating'])
         
         # Handle missing values
         numeric_columns = self.data.select_dtypes(include=[np.number]).columns
@@ -83,22 +231,34 @@ class RepoDataProcessor:
         logger.info("Data cleaning completed")
         return self.data
     
+    def _rating_categorical(self, ratings: pd.Series) -> pd.Categorical:
+        """
+        Store ratings as a categorical over the configured rating scale; ratings outside
+        the scale are kept as extra categories so no values are lost
+        """
+        rating_scale = list(self.config['credit_risk']['rating_weights'])
+        unknown_ratings = sorted(set(ratings.dropna().unique()) - set(rating_scale))
+        return pd.Categorical(ratings, categories=rating_scale + unknown_ratings)
+    
     def _validate_data_ranges(self):
         """Validate data ranges and flag outliers"""
-        # Validate notional amounts
-        self.data['notional_valid'] = (self.data['notional_musd'] > 0) & (self.data['notional_musd'] < 10000)
-        
-        # Validate haircuts
-        self.data['haircut_valid'] = (self.data['haircut_pct'] >= 0) & (self.data['haircut_pct'] <= 50)
-        
-        # Validate repo rates
-        self.data['repo_rate_valid'] = (self.data['repo_rate_pct'] >= -10) & (self.data['repo_rate_pct'] <= 50)
+        invalid_counts = []
+        for flag_column, column, lower_op, lower, upper_op, upper in VALID_RANGES:
+            value = self.data[column].to_numpy()
+            if ne is not None:
+                # Both bounds and the AND in one fused pass, without temporary masks
+                valid = ne.evaluate(f"(value {lower_op} {lower}) & (value {upper_op} {upper})",
+                                    local_dict={'value': value})
+            else:
+                valid = COMPARISONS[lower_op](value, lower) & COMPARISONS[upper_op](value, upper)
+            self.data[flag_column] = valid
+            invalid_counts.append(len(valid) - np.count_nonzero(valid))
         
         # Log validation results
-        invalid_notional = (~self.data['notional_valid']).sum()
-        invalid_haircut = (~self.data['haircut_valid']).sum()
-        invalid_repo_rate = (~self.data['repo_rate_valid']).sum()
-        
+        self._log_invalid_ranges(*invalid_counts)
+    
+    def _log_invalid_ranges(self, invalid_notional: int, invalid_haircut: int, invalid_repo_rate: int):
+        """Warn about records failing each range validation"""
         if invalid_notional > 0:
             logger.warning(f"Found {invalid_notional} records with invalid notional amounts")
         if invalid_haircut > 0:
@@ -106,192 +266,521 @@ class RepoDataProcessor:
         if invalid_repo_rate > 0:
             logger.warning(f"Found {invalid_repo_rate} records with invalid repo rates")
     
-    def derive_risk_fields(self) -> pd.DataFrame:
-        """Derive additional risk fields from the base data"""
+    def derive_risk_fields(self, fast: bool = False) -> pd.DataFrame:
+        """
+        Derive additional risk fields from the base data
+        
+        Args:
+            fast: Use the compiled derivation kernel whatever the trade count; without
+                Numba the NumPy derivation runs
+        """
         if self.data is None:
             raise ValueError("No data loaded. Call load_data() first.")
         
         logger.info("Deriving additional risk fields...")
         
-        # Create a copy for processing
-        self.processed_data = self.data.copy()
+        # The raw frame is only read; derived columns land in a new processed frame
+        if FUSED_KERNEL_AVAILABLE and (fast or len(self.data) >= self.fused_kernel_min_trades):
+            self._derive_risk_fields_fused()
+            logger.info("Risk field derivation completed")
+            return self.processed_data
+        
+        # Derived columns are collected here and joined onto the frame in one step
+        derived = {}
         
         # 1. Credit Risk Fields
-        self._derive_credit_risk_fields()
+        self._derive_credit_risk_fields(derived)
         
         # 2. Market Risk Fields
-        self._derive_market_risk_fields()
+        self._derive_market_risk_fields(derived)
         
         # 3. Liquidity Risk Fields
-        self._derive_liquidity_risk_fields()
+        self._derive_liquidity_risk_fields(derived)
         
         # 4. Operational Risk Fields
-        self._derive_operational_risk_fields()
+        self._derive_operational_risk_fields(derived)
         
         # 5. Term Risk Fields
-        self._derive_term_risk_fields()
+        self._derive_term_risk_fields(derived)
         
         # 6. Stress Testing Fields
-        self._derive_stress_testing_fields()
+        self._derive_stress_testing_fields(derived)
         
         # 7. Composite Risk Score
-        self._calculate_composite_risk_score()
+        self._calculate_composite_risk_score(derived)
+        
+        # Attach by position; a join would match repeated index labels against each other
+        self.processed_data = self.data.assign(**derived)
         
         logger.info("Risk field derivation completed")
         return self.processed_data
     
-    def _derive_credit_risk_fields(self):
+    def derive_risk_fields_polars(self, file_path: str) -> pd.DataFrame:
+        """
+        Load, clean and derive risk fields for a CSV in one lazy Polars query
+        
+        Alternative to load_data, clean_data and derive_risk_fields that produces the same
+        processed frame; the derivation is expressed as a single with_columns so Polars can
+        fuse it and reuse the shared sub-expressions across its threads.
+        """
+        if pl is None:
+            raise ImportError("polars is required for derive_risk_fields_polars")
+        
+        logger.info(f"Loading and deriving risk fields from {file_path} with Polars")
+        consts = self.risk_consts
+        credit_config = self.config['credit_risk']
+        
+        def unit_capped(expr):
+            return expr.clip(upper_bound=1.0)
+        
+        # 1. Credit Risk Fields
+        rating_risk_weight = pl.col('counterparty_rating').replace_strict(
+            credit_config['rating_weights'], default=None, return_dtype=pl.Float64
+        )
+        credit_risk_score = rating_risk_weight / 100
+        
+        # 2. Market Risk Fields
+        collateral_quality_score = (
+            (pl.col('collateral_liquidity_score') * 0.4) +
+            ((1 - pl.col('collateral_price_vol_20d_pct') / 100) * 0.3) +
+            ((pl.col('collateral_duration_years') <= 5).cast(pl.Float64) * 0.3)
+        )
+        haircut_risk_score = pl.col('haircut_pct') / consts.max_haircut_pct
+        specialness_risk_score = pl.col('specialness_bp') / consts.max_specialness_bp
+        market_risk_score = (1 - collateral_quality_score) * 0.4 + haircut_risk_score * 0.3 + specialness_risk_score * 0.3
+        
+        # 3. Liquidity Risk Fields
+        encumbrance_risk_score = unit_capped(pl.col('encumbrance_days') / consts.max_encumbrance_days)
+        margin_call_risk_score = unit_capped(
+            (pl.col('margin_call_mild_musd') / consts.max_mild_margin_call_musd * 0.5) +
+            (pl.col('margin_call_severe_musd') / consts.max_severe_margin_call_musd * 0.5)
+        )
+        liquidity_risk_score = encumbrance_risk_score * 0.6 + margin_call_risk_score * 0.4
+        
+        # 4. Operational Risk Fields
+        ccp_clearing_risk_score = 1 - pl.col('ccp_cleared_flag')
+        operational_risk_score = (
+            pl.col('wrong_way_risk_flag') * 0.4 + pl.col('cross_ccy_flag') * 0.3 + ccp_clearing_risk_score * 0.3
+        )
+        
+        # 5. Term Risk Fields
+        maturity_risk_score = unit_capped(pl.col('days_to_maturity') / consts.max_term_days)
+        open_repo_risk_score = (pl.col('term_type') == 'Open').fill_null(False).cast(pl.Int64)
+        term_risk_score = maturity_risk_score * 0.7 + open_repo_risk_score * 0.3
+        
+        # 7. Composite Risk Score
+        composite_risk_score = (
+            credit_risk_score * consts.credit_weight +
+            market_risk_score * consts.market_weight +
+            liquidity_risk_score * consts.liquidity_weight +
+            operational_risk_score * consts.operational_weight +
+            term_risk_score * consts.term_weight
+        )
+        
+        derived_columns = {
+            'notional_valid': (pl.col('notional_musd') > 0) & (pl.col('notional_musd') < 10000),
+            'haircut_valid': (pl.col('haircut_pct') >= 0) & (pl.col('haircut_pct') <= 50),
+            'repo_rate_valid': (pl.col('repo_rate_pct') >= -10) & (pl.col('repo_rate_pct') <= 50),
+            'rating_risk_weight': rating_risk_weight,
+            'credit_risk_score': credit_risk_score,
+            'high_risk_rating_flag': (
+                pl.col('counterparty_rating') >= credit_config['high_risk_rating_threshold']
+            ).fill_null(False),
+            'credit_adjusted_exposure': pl.col('notional_musd') * (1 + credit_risk_score),
+            'collateral_quality_score': collateral_quality_score,
+            'haircut_risk_score': haircut_risk_score,
+            'specialness_risk_score': specialness_risk_score,
+            'market_risk_score': market_risk_score,
+            'encumbrance_risk_score': encumbrance_risk_score,
+            'margin_call_risk_score': margin_call_risk_score,
+            'liquidity_risk_score': liquidity_risk_score,
+            'wrong_way_risk_score': pl.col('wrong_way_risk_flag'),
+            'cross_currency_risk_score': pl.col('cross_ccy_flag'),
+            'ccp_clearing_risk_score': ccp_clearing_risk_score,
+            'operational_risk_score': operational_risk_score,
+            'maturity_risk_score': maturity_risk_score,
+            'open_repo_risk_score': open_repo_risk_score,
+            'term_risk_score': term_risk_score,
+            # 6. Stress Testing Fields
+            'mild_stress_exposure': pl.col('notional_musd') * consts.mild_stress,
+            'severe_stress_exposure': pl.col('notional_musd') * consts.severe_stress,
+            'mild_stress_risk_score': unit_capped(credit_risk_score * consts.mild_stress),
+            'severe_stress_risk_score': unit_capped(credit_risk_score * consts.severe_stress),
+            'composite_risk_score': composite_risk_score
+        }
+        float32_columns = {'rating_risk_weight', *RISK_SCORE_COLUMNS}
+        
+        # Clean as clean_data does, then derive every field in one with_columns
+        processed = (
+            pl.scan_csv(file_path, schema_overrides=pl.from_arrow(TRADE_SCHEMA.empty_table()).schema)
+            .with_columns(pl.selectors.numeric().fill_null(0))
+            .with_columns(
+                (expr.cast(pl.Float32) if name in float32_columns else expr).alias(name)
+                for name, expr in derived_columns.items()
+            )
+            .collect(engine='streaming')
+            .to_pandas()
+        )
+        
+        processed['counterparty_rating'] = self._rating_categorical(processed['counterparty_rating'])
+        processed['risk_category'] = self._risk_category_labels(processed['composite_risk_score'].to_numpy())
+        self._log_invalid_ranges(
+            (~processed['notional_valid']).sum(),
+            (~processed['haircut_valid']).sum(),
+            (~processed['repo_rate_valid']).sum()
+        )
+        
+        self.data = processed.drop(
+            columns=[name for name in derived_columns if not name.endswith('_valid')] + ['risk_category']
+        )
+        self.processed_data = processed
+        logger.info("Risk field derivation completed")
+        return self.processed_data
+    
+    def _rating_lookup(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Gather the rating risk weight and high risk rating flag of every trade"""
+        ratings = self.data['counterparty_rating']
+        if not isinstance(ratings.dtype, pd.CategoricalDtype):
+            ratings = ratings.astype('category')
+        
+        # Resolve each category once (the flag keeps the string comparison against the
+        # threshold); the trailing entry serves missing ratings (code -1)
+        categories = ratings.cat.categories.astype(object)
+        rating_weights = self.config['credit_risk']['rating_weights']
+        high_risk_threshold = self.config['credit_risk']['high_risk_rating_threshold']
+        category_weights = np.append(categories.map(rating_weights).to_numpy(dtype=np.float64), np.nan)
+        category_flags = np.append(np.array([rating >= high_risk_threshold for rating in categories], dtype=bool), False)
+        
+        codes = ratings.cat.codes.to_numpy()
+        return category_weights[codes], category_flags[codes]
+    
+    def _derive_risk_fields_fused(self):
+        """Derive every risk field with one pass of the compiled kernel"""
+        data = self.data
+        
+        rating_risk_weight, high_risk_rating_flag = self._rating_lookup()
+        open_repo_risk_score = (data['term_type'] == 'Open').astype(int)
+        
+        def column(values):
+            return np.ascontiguousarray(values.to_numpy(dtype=np.float64))
+        
+        scores = compute_risk_scores(
+            column(data['notional_musd']),
+            rating_risk_weight,
+            column(data['collateral_liquidity_score']),
+            column(data['collateral_price_vol_20d_pct']),
+            column(data['collateral_duration_years']),
+            column(data['haircut_pct']),
+            column(data['specialness_bp']),
+            column(data['encumbrance_days']),
+            column(data['margin_call_mild_musd']),
+            column(data['margin_call_severe_musd']),
+            column(data['wrong_way_risk_flag']),
+            column(data['cross_ccy_flag']),
+            column(data['ccp_cleared_flag']),
+            column(data['days_to_maturity']),
+            column(open_repo_risk_score),
+            astuple(self.risk_consts)
+        )
+        derived = dict(zip(RISK_SCORE_COLUMNS, scores))
+        
+        # Reassemble the columns in the order the pandas path creates them
+        self.processed_data = data.assign(
+            rating_risk_weight=rating_risk_weight.astype(np.float32),
+            credit_risk_score=derived['credit_risk_score'],
+            high_risk_rating_flag=high_risk_rating_flag,
+            credit_adjusted_exposure=derived['credit_adjusted_exposure'],
+            collateral_quality_score=derived['collateral_quality_score'],
+            haircut_risk_score=derived['haircut_risk_score'],
+            specialness_risk_score=derived['specialness_risk_score'],
+            market_risk_score=derived['market_risk_score'],
+            encumbrance_risk_score=derived['encumbrance_risk_score'],
+            margin_call_risk_score=derived['margin_call_risk_score'],
+            liquidity_risk_score=derived['liquidity_risk_score'],
+            wrong_way_risk_score=data['wrong_way_risk_flag'],
+            cross_currency_risk_score=data['cross_ccy_flag'],
+            ccp_clearing_risk_score=1 - data['ccp_cleared_flag'],
+            operational_risk_score=derived['operational_risk_score'],
+            maturity_risk_score=derived['maturity_risk_score'],
+            open_repo_risk_score=open_repo_risk_score,
+            term_risk_score=derived['term_risk_score'],
+            mild_stress_exposure=derived['mild_stress_exposure'],
+            severe_stress_exposure=derived['severe_stress_exposure'],
+            mild_stress_risk_score=derived['mild_stress_risk_score'],
+            severe_stress_risk_score=derived['severe_stress_risk_score'],
+            composite_risk_score=derived['composite_risk_score'],
+            risk_category=self._risk_category_labels(derived['composite_risk_score'])
+        )
+    
+    def _column(self, column: str) -> np.ndarray:
+        """Return a raw trade column as a NumPy array"""
+        return self.data[column].to_numpy()
+    
+    def _derive_credit_risk_fields(self, derived: Dict):
         """Derive credit risk related fields"""
+        notional = self._column('notional_musd')
+        rating_risk_weight, high_risk_rating_flag = self._rating_lookup()
+        
         # Rating risk weight
-        rating_weights = self.config['credit_risk']['rating_weights']
-        self.processed_data['rating_risk_weight'] = self.processed_data['counterparty_rating'].map(rating_weights)
+        derived['rating_risk_weight'] = rating_risk_weight
         
         # Credit risk score (0-1 scale)
-        self.processed_data['credit_risk_score'] = self.processed_data['rating_risk_weight'] / 100
+        credit_risk_score = rating_risk_weight / 100
+        derived['credit_risk_score'] = credit_risk_score
         
         # High risk rating flag
-        high_risk_threshold = self.config['credit_risk']['high_risk_rating_threshold']
-        self.processed_data['high_risk_rating_flag'] = (
-            self.processed_data['counterparty_rating'] >= high_risk_threshold
-        )
+        derived['high_risk_rating_flag'] = high_risk_rating_flag
         
         # Exposure weighted by credit risk
-        self.processed_data['credit_adjusted_exposure'] = (
-            self.processed_data['notional_musd'] * (1 + self.processed_data['credit_risk_score'])
-        )
+        derived['credit_adjusted_exposure'] = notional * (1 + credit_risk_score)
     
-    def _derive_market_risk_fields(self):
+    def _derive_market_risk_fields(self, derived: Dict):
         """Derive market risk related fields"""
+        liquidity_score = self._column('collateral_liquidity_score')
+        price_volatility = self._column('collateral_price_vol_20d_pct')
+        duration = self._column('collateral_duration_years')
+        haircut = self._column('haircut_pct')
+        specialness = self._column('specialness_bp')
+        
         # Collateral quality score
-        self.processed_data['collateral_quality_score'] = (
-            (self.processed_data['collateral_liquidity_score'] * 0.4) +
-            ((1 - self.processed_data['collateral_price_vol_20d_pct'] / 100) * 0.3) +
-            ((self.processed_data['collateral_duration_years'] <= 5).astype(int) * 0.3)
+        collateral_quality_score = (
+            (liquidity_score * 0.4) +
+            ((1 - price_volatility / 100) * 0.3) +
+            ((duration <= 5) * 0.3)
         )
+        derived['collateral_quality_score'] = collateral_quality_score
         
         # Haircut risk score
-        max_haircut = self.config['market_risk']['haircut']['max_haircut_pct']
-        self.processed_data['haircut_risk_score'] = self.processed_data['haircut_pct'] / max_haircut
+        haircut_risk_score = haircut / self.risk_consts.max_haircut_pct
+        derived['haircut_risk_score'] = haircut_risk_score
         
         # Specialness risk score
-        max_specialness = self.config['market_risk']['specialness']['max_specialness_bp']
-        self.processed_data['specialness_risk_score'] = self.processed_data['specialness_bp'] / max_specialness
+        specialness_risk_score = specialness / self.risk_consts.max_specialness_bp
+        derived['specialness_risk_score'] = specialness_risk_score
         
         # Market risk composite score
-        self.processed_data['market_risk_score'] = (
-            (1 - self.processed_data['collateral_quality_score']) * 0.4 +
-            self.processed_data['haircut_risk_score'] * 0.3 +
-            self.processed_data['specialness_risk_score'] * 0.3
+        derived['market_risk_score'] = (
+            (1 - collateral_quality_score) * 0.4 +
+            haircut_risk_score * 0.3 +
+            specialness_risk_score * 0.3
         )
     
-    def _derive_liquidity_risk_fields(self):
+    def _derive_liquidity_risk_fields(self, derived: Dict):
         """Derive liquidity risk related fields"""
+        encumbrance_days = self._column('encumbrance_days')
+        mild_margin_call = self._column('margin_call_mild_musd')
+        severe_margin_call = self._column('margin_call_severe_musd')
+        
         # Encumbrance risk score
-        max_encumbrance = self.config['liquidity_risk']['encumbrance']['max_encumbrance_days']
-        self.processed_data['encumbrance_risk_score'] = (
-            self.processed_data['encumbrance_days'] / max_encumbrance
-        ).clip(upper=1.0)
+        encumbrance_risk_score = encumbrance_days / self.risk_consts.max_encumbrance_days
+        np.minimum(encumbrance_risk_score, 1.0, out=encumbrance_risk_score)
+        derived['encumbrance_risk_score'] = encumbrance_risk_score
         
         # Margin call risk score
-        max_mild_margin = self.config['liquidity_risk']['margin_calls']['max_mild_margin_call_musd']
-        max_severe_margin = self.config['liquidity_risk']['margin_calls']['max_severe_margin_call_musd']
-        
-        self.processed_data['margin_call_risk_score'] = (
-            (self.processed_data['margin_call_mild_musd'] / max_mild_margin * 0.5) +
-            (self.processed_data['margin_call_severe_musd'] / max_severe_margin * 0.5)
-        ).clip(upper=1.0)
+        margin_call_risk_score = mild_margin_call / self.risk_consts.max_mild_margin_call_musd * 0.5
+        margin_call_risk_score += severe_margin_call / self.risk_consts.max_severe_margin_call_musd * 0.5
+        np.minimum(margin_call_risk_score, 1.0, out=margin_call_risk_score)
+        derived['margin_call_risk_score'] = margin_call_risk_score
         
         # Liquidity risk composite score
-        self.processed_data['liquidity_risk_score'] = (
-            self.processed_data['encumbrance_risk_score'] * 0.6 +
-            self.processed_data['margin_call_risk_score'] * 0.4
-        )
+        derived['liquidity_risk_score'] = encumbrance_risk_score * 0.6 + margin_call_risk_score * 0.4
     
-    def _derive_operational_risk_fields(self):
+    def _derive_operational_risk_fields(self, derived: Dict):
         """Derive operational risk related fields"""
+        wrong_way_risk = self._column('wrong_way_risk_flag')
+        cross_currency = self._column('cross_ccy_flag')
+        ccp_cleared = self._column('ccp_cleared_flag')
+        
         # Wrong way risk score
-        self.processed_data['wrong_way_risk_score'] = self.processed_data['wrong_way_risk_flag']
+        derived['wrong_way_risk_score'] = wrong_way_risk
         
         # Cross currency risk score
-        self.processed_data['cross_currency_risk_score'] = self.processed_data['cross_ccy_flag']
+        derived['cross_currency_risk_score'] = cross_currency
         
         # CCP clearing risk score (inverse of CCP cleared flag)
-        self.processed_data['ccp_clearing_risk_score'] = 1 - self.processed_data['ccp_cleared_flag']
+        ccp_clearing_risk_score = 1 - ccp_cleared
+        derived['ccp_clearing_risk_score'] = ccp_clearing_risk_score
         
         # Operational risk composite score
-        self.processed_data['operational_risk_score'] = (
-            self.processed_data['wrong_way_risk_score'] * 0.4 +
-            self.processed_data['cross_currency_risk_score'] * 0.3 +
-            self.processed_data['ccp_clearing_risk_score'] * 0.3
+        derived['operational_risk_score'] = (
+            wrong_way_risk * 0.4 +
+            cross_currency * 0.3 +
+            ccp_clearing_risk_score * 0.3
         )
     
-    def _derive_term_risk_fields(self):
+    def _derive_term_risk_fields(self, derived: Dict):
         """Derive term risk related fields"""
+        days_to_maturity = self._column('days_to_maturity')
+        
         # Maturity risk score
-        max_term = self.config['term_risk']['maturity']['max_term_days']
-        self.processed_data['maturity_risk_score'] = (
-            self.processed_data['days_to_maturity'] / max_term
-        ).clip(upper=1.0)
+        maturity_risk_score = days_to_maturity / self.risk_consts.max_term_days
+        np.minimum(maturity_risk_score, 1.0, out=maturity_risk_score)
+        derived['maturity_risk_score'] = maturity_risk_score
         
-        # Open repo risk score
-        self.processed_data['open_repo_risk_score'] = (
-            self.processed_data['term_type'] == 'Open'
-        ).astype(int)
+        # Open repo risk score, stored as 0/1 while the composite uses the mask directly
+        open_repo = (self.data['term_type'] == 'Open').to_numpy()
+        derived['open_repo_risk_score'] = open_repo.astype(int)
         
         # Term risk composite score
-        self.processed_data['term_risk_score'] = (
-            self.processed_data['maturity_risk_score'] * 0.7 +
-            self.processed_data['open_repo_risk_score'] * 0.3
-        )
+        derived['term_risk_score'] = maturity_risk_score * 0.7 + open_repo * 0.3
     
-    def _derive_stress_testing_fields(self):
+    def _derive_stress_testing_fields(self, derived: Dict):
         """Derive stress testing related fields"""
+        notional = self._column('notional_musd')
+        credit_risk_score = derived['credit_risk_score']
+        
         # Stress factor application
-        mild_stress = self.config['stress_testing']['stress_factors']['mild_stress']
-        severe_stress = self.config['stress_testing']['stress_factors']['severe_stress']
+        mild_stress = self.risk_consts.mild_stress
+        severe_stress = self.risk_consts.severe_stress
         
         # Apply stress factors to various risk metrics
-        self.processed_data['mild_stress_exposure'] = (
-            self.processed_data['notional_musd'] * mild_stress
-        )
-        self.processed_data['severe_stress_exposure'] = (
-            self.processed_data['notional_musd'] * severe_stress
-        )
-        
-        # Stress-adjusted risk scores
-        self.processed_data['mild_stress_risk_score'] = (
-            self.processed_data['credit_risk_score'] * mild_stress
-        ).clip(upper=1.0)
-        self.processed_data['severe_stress_risk_score'] = (
-            self.processed_data['credit_risk_score'] * severe_stress
-        ).clip(upper=1.0)
+        derived['mild_stress_exposure'] = notional * mild_stress
+        derived['severe_stress_exposure'] = notional * severe_stress
+        
+        # Stress-adjusted risk scores, capped at 1.0 in place (missing scores stay missing)
+        mild_stress_risk_score = credit_risk_score * mild_stress
+        severe_stress_risk_score = credit_risk_score * severe_stress
+        derived['mild_stress_risk_score'] = np.minimum(mild_stress_risk_score, 1.0, out=mild_stress_risk_score)
+        derived['severe_stress_risk_score'] = np.minimum(severe_stress_risk_score, 1.0, out=severe_stress_risk_score)
     
-    def _calculate_composite_risk_score(self):
+    def _calculate_composite_risk_score(self, derived: Dict):
         """Calculate composite risk score"""
-        weights = self.config['composite_risk']['weights']
-        
-        self.processed_data['composite_risk_score'] = (
-            self.processed_data['credit_risk_score'] * weights['credit_risk'] +
-            self.processed_data['market_risk_score'] * weights['market_risk'] +
-            self.processed_data['liquidity_risk_score'] * weights['liquidity_risk'] +
-            self.processed_data['operational_risk_score'] * weights['operational_risk'] +
-            self.processed_data['term_risk_score'] * weights['term_risk']
+        consts = self.risk_consts
+        
+        derived['composite_risk_score'] = (
+            derived['credit_risk_score'] * consts.credit_weight +
+            derived['market_risk_score'] * consts.market_weight +
+            derived['liquidity_risk_score'] * consts.liquidity_weight +
+            derived['operational_risk_score'] * consts.operational_weight +
+            derived['term_risk_score'] * consts.term_weight
         )
         
+        # Store the derived scores as float32 now that every intermediate has been used
+        for column in ('rating_risk_weight',) + RISK_SCORE_COLUMNS:
+            derived[column] = np.asarray(derived[column], dtype=np.float32)
+        
         # Risk category assignment
+        derived['risk_category'] = self._risk_category_labels(derived['composite_risk_score'])
+    
+    def _risk_category_labels(self, composite_scores: np.ndarray) -> np.ndarray:
+        """
+        Band composite scores into risk categories: scores up to and including each threshold
+        fall in that band, anything above the high risk threshold (or missing) is Critical
+        """
         thresholds = self.config['composite_risk']['score_thresholds']
+        # Edges share the scores' precision so a threshold compares like a scalar would
+        band_edges = np.array(
+            [thresholds['low_risk'], thresholds['medium_risk'], thresholds['high_risk']], dtype=composite_scores.dtype
+        )
+        band_index = np.searchsorted(band_edges, composite_scores, side='left')
+        return np.array(['Low', 'Medium', 'High', 'Critical'])[band_index]
+    
+    def process_streaming(self, file_path: str, output_path: str, batch_rows: int = 1_000_000,
+                          max_inflight: int = 4) -> int:
+        """
+        Clean and derive risk fields for a CSV too large to hold in memory
+        
+        The file is parsed incrementally and processed in batches of at least batch_rows
+        rows, each appended to a Parquet file at output_path, so neither the raw nor the
+        processed frame is ever materialized in full. Parsing, derivation and writing run
+        as a three-stage pipeline on separate threads, connected by queues holding at most
+        max_inflight batches. Returns the number of rows written.
+        """
+        logger.info(f"Streaming data from {file_path} to {output_path}")
+        reader = pa_csv.open_csv(
+            file_path,
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=128 << 20),
+            convert_options=TRADE_CONVERT_OPTIONS
+        )
         
-        def assign_risk_category(score):
-            if score <= thresholds['low_risk']:
-                return 'Low'
-            elif score <= thresholds['medium_risk']:
-                return 'Medium'
-            elif score <= thresholds['high_risk']:
-                return 'High'
-            else:
-                return 'Critical'
-        
-        self.processed_data['risk_category'] = self.processed_data['composite_risk_score'].apply(assign_risk_category)
+        parsed_batches = Queue(maxsize=max_inflight)
+        derived_batches = Queue(maxsize=max_inflight)
+        stop = threading.Event()
+        
+        # Queue hand-offs give up once another stage has failed, so no stage blocks forever
+        def put(queue, item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
+        
+        def get(queue):
+            while not stop.is_set():
+                try:
+                    return queue.get(timeout=0.1)
+                except Empty:
+                    continue
+            return None
+        
+        def parse():
+            pending_batches = []
+            pending_rows = 0
+            try:
+                for batch in reader:
+                    # Another stage failed; stop reading instead of draining the rest of the file
+                    if stop.is_set():
+                        return
+                    pending_batches.append(batch)
+                    pending_rows += batch.num_rows
+                    if pending_rows >= batch_rows:
+                        put(parsed_batches, pa.Table.from_batches(pending_batches))
+                        pending_batches = []
+                        pending_rows = 0
+                if pending_batches:
+                    put(parsed_batches, pa.Table.from_batches(pending_batches))
+            finally:
+                put(parsed_batches, None)
+        
+        def write():
+            writer = None
+            rows_written = 0
+            try:
+                while (table := get(derived_batches)) is not None:
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, table.schema, compression='snappy',
+                                                  use_dictionary=self._parquet_dictionary_columns(table),
+                                                  data_page_size=1 << 20)
+                    else:
+                        # A batch can infer a wider type (e.g. float for an integer column with gaps)
+                        table = table.cast(writer.schema)
+                    writer.write_table(table)
+                    rows_written += table.num_rows
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                if writer is not None:
+                    writer.close()
+            return rows_written
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parser = executor.submit(parse)
+            writer = executor.submit(write)
+            try:
+                while not stop.is_set() and (table := get(parsed_batches)) is not None:
+                    self.data = table.to_pandas(self_destruct=True)
+                    self.clean_data()
+                    self.derive_risk_fields()
+                    put(derived_batches, pa.Table.from_pandas(self.processed_data, preserve_index=False))
+                put(derived_batches, None)
+                rows_written = writer.result()
+                parser.result()
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                # Only the last batch would be left behind, which is not a usable result
+                self.data = None
+                self.processed_data = None
+        
+        logger.info(f"Processed {rows_written} records into {output_path}")
+        return rows_written
+    
+    def _parquet_dictionary_columns(self, table: pa.Table) -> List[str]:
+        """Return the dictionary-encoded Parquet columns present in a table"""
+        return [column for column in PARQUET_DICTIONARY_COLUMNS if column in table.column_names]
     
     def get_processed_data(self) -> pd.DataFrame:
         """Return the processed data"""
@@ -299,14 +788,56 @@ class RepoDataProcessor:
             raise ValueError("No processed data available. Call derive_risk_fields() first.")
         return self.processed_data
     
-    def save_processed_data(self, file_path: str):
-        """Save processed data to file"""
+    def save_processed_data(self, file_path: str, fmt: str = 'parquet'):
+        """
+        Save processed data to file as Parquet, as CSV for a .csv path or fmt='csv', or as
+        uncompressed Feather for a .feather/.arrow path or fmt='feather'
+        """
         if self.processed_data is None:
             raise ValueError("No processed data available. Call derive_risk_fields() first.")
         
-        self.processed_data.to_csv(file_path, index=False)
+        fmt = self._processed_data_format(file_path, fmt)
+        if fmt == 'csv':
+            self.processed_data.to_csv(file_path, index=False)
+        else:
+            table = pa.Table.from_pandas(self.processed_data, preserve_index=False)
+            if fmt == 'feather':
+                # Left uncompressed so load_processed_data can memory-map it
+                feather.write_feather(table, file_path, compression='uncompressed')
+            else:
+                pq.write_table(table, file_path, compression='snappy',
+                               use_dictionary=self._parquet_dictionary_columns(table), data_page_size=1 << 20)
         logger.info(f"Processed data saved to {file_path}")
     
+    def load_processed_data(self, file_path: str, fmt: str = 'parquet') -> pd.DataFrame:
+        """
+        Reload processed data written by save_processed_data
+        
+        Parquet and Feather files are memory-mapped; numeric columns of an uncompressed
+        Feather file stay backed by the mapping, so only the columns a later stage
+        touches are paged in.
+        """
+        fmt = self._processed_data_format(file_path, fmt)
+        logger.info(f"Loading processed data from {file_path}")
+        if fmt == 'csv':
+            self.processed_data = pd.read_csv(file_path)
+        else:
+            if fmt == 'feather':
+                table = feather.read_table(file_path, memory_map=True)
+            else:
+                table = pq.read_table(file_path, memory_map=True)
+            self.processed_data = table.to_pandas(split_blocks=True, self_destruct=True)
+        return self.processed_data
+    
+    def _processed_data_format(self, file_path: str, fmt: str) -> str:
+        """Resolve the processed data file format, letting a .csv/.feather/.arrow path override fmt"""
+        suffix = os.path.splitext(str(file_path))[1].lower()
+        if suffix == '.csv':
+            return 'csv'
+        if suffix in ('.feather', '.arrow'):
+            return 'feather'
+        return fmt
+    
     def get_data_summary(self) -> Dict:
         """Get summary statistics of the processed data"""
         if self.processed_data is None:
@@ -317,7 +848,7 @@ class RepoDataProcessor:
             'total_notional': self.processed_data['notional_musd'].sum(),
             'unique_counterparties': self.processed_data['counterparty_type'].nunique(),
             'risk_distribution': self.processed_data['risk_category'].value_counts().to_dict(),
-            'average_risk_score': self.processed_data['composite_risk_score'].mean(),
+            'average_risk_score': float(self.processed_data['composite_risk_score'].mean()),
             'high_risk_trades': (self.processed_data['composite_risk_score'] > 0.7).sum(),
             'critical_risk_trades': (self.processed_data['composite_risk_score'] > 0.9).sum()
         }
@@ -8,9 +8,11 @@ import sys
 import os
 import logging
 from pathlib import Path
+import time
 import yaml
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 
 # Add src directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -29,6 +31,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Report files written per run, as (name, extension); each is saved as <name>_<timestamp>.<extension>
+REPORT_FILES = (
+    ('processed_data', 'parquet'),
+    ('counterparty_risk_analysis', 'xlsx'),
+    ('risk_summary', 'txt'),
+    ('high_risk_counterparties', 'csv'),
+    ('dashboard_data', 'json'),
+)
+
 class CounterpartyRiskAnalysisApp:
     """
     Main application class for counterparty risk analysis
@@ -99,30 +110,38 @@ class CounterpartyRiskAnalysisApp:
     
     def _generate_reports(self, analysis_results: dict, processed_data: pd.DataFrame, output_dir: str):
         """Generate various reports and outputs"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        report_dir = Path(output_dir)
+        report_files = {
+            name: report_dir / f"{name}_{timestamp}.{extension}"
+            for name, extension in REPORT_FILES
+        }
         
         # 1. Save processed data
-        processed_data_file = os.path.join(output_dir, f"processed_data_{timestamp}.csv")
-        self.data_processor.save_processed_data(processed_data_file)
+        self.data_processor.save_processed_data(report_files['processed_data'])
         
         # 2. Export analysis results to Excel
-        excel_file = os.path.join(output_dir, f"counterparty_risk_analysis_{timestamp}.xlsx")
-        self.analyzer.export_analysis_results(excel_file)
+        self.analyzer.export_analysis_results(report_files['counterparty_risk_analysis'])
         
         # 3. Generate risk summary report
-        summary_file = os.path.join(output_dir, f"risk_summary_{timestamp}.txt")
-        self._generate_summary_report(analysis_results, summary_file)
+        self._generate_summary_report(analysis_results, report_files['risk_summary'])
         
         # 4. Generate high-risk counterparty report
-        high_risk_file = os.path.join(output_dir, f"high_risk_counterparties_{timestamp}.csv")
+        high_risk_file = report_files['high_risk_counterparties']
         high_risk_df = self.analyzer.get_high_risk_counterparties_details()
         if not high_risk_df.empty:
-            high_risk_df.to_csv(high_risk_file, index=False)
+            # Arrow quotes the header and every text value (e.g. "Bank",...,"Medium"),
+            # unlike pandas, which only quoted fields containing a delimiter; numeric
+            # values are written unquoted as before
+            pa_csv.write_csv(
+                pa.Table.from_pandas(high_risk_df, preserve_index=False),
+                str(high_risk_file),
+                write_options=pa_csv.WriteOptions(include_header=True, batch_size=1 << 16, quoting_style='needed')
+            )
             logger.info(f"High-risk counterparties report saved to {high_risk_file}")
         
         # 5. Generate portfolio risk dashboard data
-        dashboard_file = os.path.join(output_dir, f"dashboard_data_{timestamp}.json")
-        self._generate_dashboard_data(analysis_results, dashboard_file)
+        self._generate_dashboard_data(analysis_results, report_files['dashboard_data'])
         
         logger.info(f"All reports generated in {output_dir}")
     
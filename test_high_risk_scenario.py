@@ -7,52 +7,177 @@ import pandas as pd
 import numpy as np
 import sys
 import os
+import argparse
+import functools
+import hashlib
+import tempfile
+import multiprocessing
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
 # Add src directory to path
 sys.path.append('src')
 
+import data_processor
 from data_processor import RepoDataProcessor
 from counterparty_analyzer import CounterpartyRiskAnalyzer
+from _risk_kernels import NUMBA_AVAILABLE
+
+CONFIG_FILE = 'config/risk_thresholds.yaml'
+DATA_FILE = 'data/repo_simulation_with_cash_legs.csv'
+CACHE_DIR = Path('reports') / '.cache'
+
+# Trade count from which compare_scenarios runs its two pipelines in worker processes
+COMPARE_POOL_MIN_TRADES = 1_000_000
+
+@functools.lru_cache(maxsize=1)
+def _cache_key():
+    """
+    Version of the cached frames: the input CSV and config modification times plus
+    a hash of the code that builds the frames (this script and data_processor.py)
+    """
+    code_hash = hashlib.sha256()
+    for source_file in (__file__, data_processor.__file__):
+        with open(source_file, 'rb') as file:
+            code_hash.update(file.read())
+    return f"{os.stat(DATA_FILE).st_mtime_ns}_{os.stat(CONFIG_FILE).st_mtime_ns}_{code_hash.hexdigest()[:16]}"
+
+def _cached_frame(name, build):
+    """Load a frame from the parquet cache, rebuilding it when its inputs or code changed"""
+    cache_file = CACHE_DIR / f"{name}_{_cache_key()}.parquet"
+    try:
+        return pd.read_parquet(cache_file)
+    except FileNotFoundError:
+        pass
+    
+    frame = build()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for stale_file in CACHE_DIR.glob(f"{name}_*.parquet"):
+        if stale_file != cache_file:
+            stale_file.unlink(missing_ok=True)
+    
+    # Write to a private temp file and move it into place, so concurrent runs
+    # (e.g. the comparison workers) never read a partially written cache file
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, prefix=f"{name}_", suffix='.tmp', delete=False) as file:
+        temp_file = file.name
+    try:
+        frame.to_parquet(temp_file, index=False)
+        os.replace(temp_file, cache_file)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    return frame
+
+@functools.lru_cache(maxsize=1)
+def _load_original_data():
+    """Load and clean the original trade data once per input version"""
+    
+    def build():
+        processor = RepoDataProcessor(CONFIG_FILE)
+        processor.load_data(DATA_FILE)
+        processor.clean_data()
+        return processor.data
+    
+    return _cached_frame('original_data', build)
+
+@functools.lru_cache(maxsize=1)
+def _build_high_risk_data():
+    """Apply the high-risk scenarios to the original data once per input version"""
+    return _cached_frame('high_risk_data', _apply_high_risk_scenarios)
 
 def create_high_risk_test_data():
     """Create test data with high-risk scenarios"""
+    # Callers may modify the frame, so hand out a copy of the memoized one
+    return _build_high_risk_data().copy(deep=False)
+
+def _replaced(column_data, *updates):
+    """
+    Copy of a column's values with each (mask, value) update applied in order
     
-    # Load original data
-    processor = RepoDataProcessor('config/risk_thresholds.yaml')
-    processor.load_data('data/repo_simulation_with_cash_legs.csv')
-    processor.clean_data()
-    original_data = processor.data.copy()
-    
-    # Create high-risk scenarios
-    high_risk_data = original_data.copy()
-    
-    # Scenario 1: High-risk HedgeFund with poor ratings and high exposure
-    hedgefund_mask = high_risk_data['counterparty_type'] == 'HedgeFund'
-    high_risk_data.loc[hedgefund_mask, 'counterparty_rating'] = 'BB'  # Below investment grade
-    high_risk_data.loc[hedgefund_mask, 'haircut_pct'] = 25.0  # High haircut
-    high_risk_data.loc[hedgefund_mask, 'specialness_bp'] = 75  # High specialness
-    high_risk_data.loc[hedgefund_mask, 'wrong_way_risk_flag'] = 1  # Wrong way risk
-    high_risk_data.loc[hedgefund_mask, 'notional_musd'] *= 2  # Double exposure
-    
-    # Scenario 2: High-risk Dealer with concentration issues
-    dealer_mask = high_risk_data['counterparty_type'] == 'Dealer'
-    high_risk_data.loc[dealer_mask, 'counterparty_rating'] = 'BBB'  # Lower rating
-    high_risk_data.loc[dealer_mask, 'encumbrance_days'] = 45  # Long encumbrance
-    high_risk_data.loc[dealer_mask, 'margin_call_severe_musd'] = 15.0  # High margin call risk
-    high_risk_data.loc[dealer_mask, 'notional_musd'] *= 1.5  # Increase exposure
-    
-    # Scenario 3: High-risk Bank with operational issues
-    bank_mask = high_risk_data['counterparty_type'] == 'Bank'
-    high_risk_data.loc[bank_mask, 'cross_ccy_flag'] = 1  # Cross currency risk
-    high_risk_data.loc[bank_mask, 'ccp_cleared_flag'] = 0  # Not CCP cleared
-    high_risk_data.loc[bank_mask, 'days_to_maturity'] = 400  # Long term
-    high_risk_data.loc[bank_mask, 'notional_musd'] *= 1.8  # High exposure
+    Categorical columns are updated through their codes so they keep their dtype.
+    """
+    if isinstance(column_data.dtype, pd.CategoricalDtype):
+        codes = column_data.cat.codes.to_numpy(copy=True)
+        for mask, value in updates:
+            codes[mask] = column_data.cat.categories.get_loc(value)
+        return pd.Categorical.from_codes(codes, dtype=column_data.dtype)
+    
+    values = column_data.to_numpy(copy=True)
+    for mask, value in updates:
+        values[mask] = value
+    return values
+
+def _code_mask(codes, categories, value):
+    """Mask of the rows whose categorical code is the given category's"""
+    if value not in categories:
+        return np.zeros(len(codes), dtype=bool)
+    return codes == categories.get_loc(value)
+
+def _apply_high_risk_scenarios():
+    """Build the high-risk scenarios from the original data"""
+    
+    original_data = _load_original_data()
+    
+    # Counterparty type masks, compared once on the categorical codes
+    counterparty_type = original_data['counterparty_type'].astype('category')
+    type_codes = counterparty_type.cat.codes.to_numpy()
+    hedgefund_mask = _code_mask(type_codes, counterparty_type.cat.categories, 'HedgeFund')
+    dealer_mask = _code_mask(type_codes, counterparty_type.cat.categories, 'Dealer')
+    bank_mask = _code_mask(type_codes, counterparty_type.cat.categories, 'Bank')
+    
+    # clean_data already encodes counterparty_rating as a categorical over the rating
+    # scale; make sure the scenario ratings are categories so they land as codes
+    ratings = original_data['counterparty_rating'].astype('category')
+    ratings = ratings.cat.add_categories([
+        rating for rating in ('BB', 'BBB') if rating not in ratings.cat.categories
+    ])
+    
+    # Exposure increases of all three scenarios, applied in a single pass
+    exposure_multiplier = np.ones(len(original_data), dtype=np.float64)
+    exposure_multiplier[hedgefund_mask] = 2.0  # HedgeFund: double exposure
+    exposure_multiplier[dealer_mask] = 1.5  # Dealer: increase exposure
+    exposure_multiplier[bank_mask] = 1.8  # Bank: high exposure
+    notional = original_data['notional_musd'].to_numpy(copy=True)
+    np.multiply(notional, exposure_multiplier, out=notional)
+    
+    # Every edited column is attached in one assign; untouched columns are shared
+    # with the memoized original data rather than copied
+    high_risk_data = original_data.assign(
+        counterparty_type=counterparty_type,
+        counterparty_rating=_replaced(
+            ratings,
+            (hedgefund_mask, 'BB'),  # Below investment grade
+            (dealer_mask, 'BBB')  # Lower rating
+        ),
+        notional_musd=notional,
+        
+        # Scenario 1: High-risk HedgeFund with poor ratings and high exposure
+        haircut_pct=_replaced(original_data['haircut_pct'], (hedgefund_mask, 25.0)),  # High haircut
+        specialness_bp=_replaced(original_data['specialness_bp'], (hedgefund_mask, 75)),  # High specialness
+        wrong_way_risk_flag=_replaced(original_data['wrong_way_risk_flag'], (hedgefund_mask, 1)),  # Wrong way risk
+        
+        # Scenario 2: High-risk Dealer with concentration issues
+        encumbrance_days=_replaced(original_data['encumbrance_days'], (dealer_mask, 45)),  # Long encumbrance
+        margin_call_severe_musd=_replaced(original_data['margin_call_severe_musd'], (dealer_mask, 15.0)),  # High margin call risk
+        
+        # Scenario 3: High-risk Bank with operational issues
+        cross_ccy_flag=_replaced(original_data['cross_ccy_flag'], (bank_mask, 1)),  # Cross currency risk
+        ccp_cleared_flag=_replaced(original_data['ccp_cleared_flag'], (bank_mask, 0)),  # Not CCP cleared
+        days_to_maturity=_replaced(original_data['days_to_maturity'], (bank_mask, 400))  # Long term
+    )
     
     return high_risk_data
 
-def test_high_risk_scenarios():
-    """Test the system with high-risk scenarios"""
+def test_high_risk_scenarios(write_csv=False, fast=False):
+    """
+    Test the system with high-risk scenarios
+    
+    Args:
+        write_csv: Also save the processed test data as CSV next to the Parquet file
+        fast: Derive the risk fields with the fused Numba kernel
+    """
     
     print("🧪 Testing High-Risk Counterparty Scenarios")
     print("=" * 50)
@@ -61,9 +186,9 @@ def test_high_risk_scenarios():
     test_data = create_high_risk_test_data()
     
     # Process the data
-    processor = RepoDataProcessor('config/risk_thresholds.yaml')
+    processor = RepoDataProcessor(CONFIG_FILE)
     processor.data = test_data
-    processed_data = processor.derive_risk_fields()
+    processed_data = processor.derive_risk_fields(fast=fast)
     
     # Analyze counterparties
     analyzer = CounterpartyRiskAnalyzer(processor.config)
@@ -78,16 +203,25 @@ def test_high_risk_scenarios():
     # Show high-risk counterparties
     if analysis_results['high_risk_counterparties']:
         print(f"\n🔴 HIGH-RISK COUNTERPARTIES IDENTIFIED:")
-        for counterparty in analysis_results['high_risk_counterparties']:
-            profile = analysis_results['counterparty_profiles'][counterparty]
-            print(f"\n  • {counterparty}:")
-            print(f"    - Total Exposure: ${profile.total_exposure:,.2f}M")
-            print(f"    - Average Risk Score: {profile.average_risk_score:.3f}")
-            print(f"    - Risk Category: {profile.risk_category}")
-            print(f"    - Concentration Ratio: {profile.concentration_ratio:.2f}%")
-            print(f"    - High Risk Trades: {profile.high_risk_trades}")
-            print(f"    - Critical Risk Trades: {profile.critical_risk_trades}")
-            print(f"    - Risk Flags: {', '.join(profile.risk_flags)}")
+        profiles = analysis_results['counterparty_profiles']
+        high_risk_table = pd.DataFrame([
+            {
+                'Counterparty': counterparty,
+                'Total Exposure': profiles[counterparty].total_exposure,
+                'Avg Risk Score': profiles[counterparty].average_risk_score,
+                'Risk Category': profiles[counterparty].risk_category,
+                'Concentration': profiles[counterparty].concentration_ratio,
+                'High Risk Trades': profiles[counterparty].high_risk_trades,
+                'Critical Risk Trades': profiles[counterparty].critical_risk_trades,
+                'Risk Flags': ', '.join(profiles[counterparty].risk_flags)
+            }
+            for counterparty in analysis_results['high_risk_counterparties']
+        ])
+        print(high_risk_table.to_string(index=False, formatters={
+            'Total Exposure': '${:,.2f}M'.format,
+            'Avg Risk Score': '{:.3f}'.format,
+            'Concentration': '{:.2f}%'.format
+        }))
     else:
         print("\n✅ No high-risk counterparties identified in test scenario.")
     
@@ -108,65 +242,156 @@ def test_high_risk_scenarios():
     
     # Save test results
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = f"reports/test_scenario_{timestamp}"
+    output_dir = os.path.join('reports', f"test_scenario_{timestamp}")
     os.makedirs(output_dir, exist_ok=True)
     
-    # Save processed test data
-    processed_data.to_csv(f"{output_dir}/test_processed_data.csv", index=False)
+    # The Excel writer is only pulled in when EMIT_XLSX is set
+    emit_xlsx = bool(os.environ.get('EMIT_XLSX'))
+    processed_path = os.path.join(output_dir, 'test_processed_data.parquet')
+    csv_path = os.path.join(output_dir, 'test_processed_data.csv')
+    analysis_path = os.path.join(output_dir, 'test_analysis_results.xlsx' if emit_xlsx else 'test_analysis_results')
     
-    # Export analysis results
-    analyzer.export_analysis_results(f"{output_dir}/test_analysis_results.xlsx")
+    def save_processed_data():
+        processor.save_processed_data(processed_path)
+        if write_csv:
+            processor.save_processed_data(csv_path)
+    
+    export_analysis_results = analyzer.export_analysis_results if emit_xlsx else analyzer.export_analysis_results_parquet
+    
+    # Save processed test data and export analysis results side by side; both
+    # only read their inputs and spend most of their time in GIL-free writers
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        writes = [executor.submit(save_processed_data), executor.submit(export_analysis_results, analysis_path)]
+        for write in writes:
+            write.result()
     
     print(f"\n✅ Test results saved to: {output_dir}")
     
     return analysis_results
 
-def compare_scenarios():
-    """Compare original vs high-risk scenarios"""
+def test_empty_portfolio():
+    """Check that a portfolio without any trades still analyzes to an empty, low-risk result"""
+    processor = RepoDataProcessor(CONFIG_FILE)
+    processor.data = _load_original_data().iloc[:0]
+    processed_data = processor.derive_risk_fields()
     
-    print("\n📈 COMPARING ORIGINAL VS HIGH-RISK SCENARIOS")
-    print("=" * 60)
+    analyzer = CounterpartyRiskAnalyzer(processor.config)
+    analysis_results = analyzer.analyze_counterparties(processed_data)
+    assert analysis_results['summary']['total_counterparties'] == 0
+    assert analysis_results['summary']['portfolio_risk_level'] == 'LOW'
+    assert not analysis_results['high_risk_counterparties']
     
-    # Original scenario
-    processor_orig = RepoDataProcessor('config/risk_thresholds.yaml')
-    processor_orig.load_data('data/repo_simulation_with_cash_legs.csv')
-    processor_orig.clean_data()
-    orig_processed = processor_orig.derive_risk_fields()
+    print("\n✅ Empty portfolio analyzed without counterparties")
+
+def _analyze_scenario(high_risk, fast=False):
+    """
+    Derive and analyze one scenario, in this or a worker process
     
-    analyzer_orig = CounterpartyRiskAnalyzer(processor_orig.config)
-    orig_results = analyzer_orig.analyze_counterparties(orig_processed)
+    Args:
+        high_risk: Analyze the high-risk scenario instead of the original data
+        fast: Derive the risk fields with the fused Numba kernel
     
-    # High-risk scenario
-    test_data = create_high_risk_test_data()
-    processor_test = RepoDataProcessor('config/risk_thresholds.yaml')
-    processor_test.data = test_data
-    test_processed = processor_test.derive_risk_fields()
+    Returns:
+        Analysis results with the summary only, which is all the comparison needs
+    """
+    processor = RepoDataProcessor(CONFIG_FILE)
+    processor.data = create_high_risk_test_data() if high_risk else _load_original_data().copy(deep=False)
+    processed_data = processor.derive_risk_fields(fast=fast)
     
-    analyzer_test = CounterpartyRiskAnalyzer(processor_test.config)
-    test_results = analyzer_test.analyze_counterparties(test_processed)
+    analyzer = CounterpartyRiskAnalyzer(processor.config)
+    analysis_results = analyzer.analyze_counterparties(processed_data)
+    return {'summary': analysis_results['summary']}
+
+def compare_scenarios(fast=False):
+    """Compare original vs high-risk scenarios"""
+    
+    print("\n📈 COMPARING ORIGINAL VS HIGH-RISK SCENARIOS")
+    print("=" * 60)
+    
+    # The two pipelines are independent, but a spawned interpreter takes far longer
+    # to start than a pipeline takes on typical data, so they run side by side only
+    # for large portfolios; workers are spawned because Numba's thread pool does not
+    # survive a fork
+    if len(_load_original_data()) >= COMPARE_POOL_MIN_TRADES:
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+            orig_future = executor.submit(_analyze_scenario, False, fast)
+            test_future = executor.submit(_analyze_scenario, True, fast)
+            orig_results = orig_future.result()
+            test_results = test_future.result()
+    else:
+        orig_results = _analyze_scenario(False, fast)
+        test_results = _analyze_scenario(True, fast)
     
     # Comparison table
     print(f"\n{'Metric':<30} {'Original':<15} {'High-Risk':<15} {'Change':<10}")
     print("-" * 70)
     
+    orig_summary, test_summary = orig_results['summary'], test_results['summary']
+    orig_metrics, test_metrics = orig_summary['key_risk_metrics'], test_summary['key_risk_metrics']
+    
     metrics = [
-        ('Portfolio Risk Level', orig_results['summary']['portfolio_risk_level'], test_results['summary']['portfolio_risk_level']),
-        ('Average Risk Score', f"{orig_results['summary']['key_risk_metrics']['average_risk_score']:.3f}", f"{test_results['summary']['key_risk_metrics']['average_risk_score']:.3f}"),
-        ('High Risk Exposure %', f"{orig_results['summary']['key_risk_metrics']['high_risk_exposure_pct']:.2f}%", f"{test_results['summary']['key_risk_metrics']['high_risk_exposure_pct']:.2f}%"),
-        ('Critical Risk Exposure %', f"{orig_results['summary']['key_risk_metrics']['critical_risk_exposure_pct']:.2f}%", f"{test_results['summary']['key_risk_metrics']['critical_risk_exposure_pct']:.2f}%"),
-        ('High-Risk Counterparties', orig_results['summary']['high_risk_counterparties'], test_results['summary']['high_risk_counterparties']),
-        ('Concentration HHI', f"{orig_results['summary']['key_risk_metrics']['concentration_hhi']:.3f}", f"{test_results['summary']['key_risk_metrics']['concentration_hhi']:.3f}")
+        ('Portfolio Risk Level', orig_summary['portfolio_risk_level'], test_summary['portfolio_risk_level']),
+        ('Average Risk Score', f"{orig_metrics['average_risk_score']:.3f}", f"{test_metrics['average_risk_score']:.3f}"),
+        ('High Risk Exposure %', f"{orig_metrics['high_risk_exposure_pct']:.2f}%", f"{test_metrics['high_risk_exposure_pct']:.2f}%"),
+        ('Critical Risk Exposure %', f"{orig_metrics['critical_risk_exposure_pct']:.2f}%", f"{test_metrics['critical_risk_exposure_pct']:.2f}%"),
+        ('High-Risk Counterparties', orig_summary['high_risk_counterparties'], test_summary['high_risk_counterparties']),
+        ('Concentration HHI', f"{orig_metrics['concentration_hhi']:.3f}", f"{test_metrics['concentration_hhi']:.3f}")
     ]
     
-    for metric, orig_val, test_val in metrics:
-        change = "↗️" if orig_val != test_val else "➡️"
+    # Change markers from one vectorized compare of the formatted values
+    _, orig_vals, test_vals = zip(*metrics)
+    changes = np.where(np.asarray(orig_vals, dtype=str) != np.asarray(test_vals, dtype=str), "↗️", "➡️")
+    
+    for (metric, orig_val, test_val), change in zip(metrics, changes):
         print(f"{metric:<30} {orig_val:<15} {test_val:<15} {change:<10}")
 
+# Calls the aggregation kernel with the analyzer's argument types and prints how
+# many signatures had to be compiled instead of loaded from Numba's disk cache
+KERNEL_CACHE_PROBE = """
+import sys
+sys.path.append('src')
+import numpy as np
+from counterparty_analyzer import AVERAGED_SCORE_COLUMNS
+from _risk_kernels import aggregate_counterparty_groups, _aggregate_counterparty_groups
+scores = tuple(np.zeros(4, dtype=np.float32) for _ in AVERAGED_SCORE_COLUMNS)
+flags = np.zeros(4, dtype=bool)
+aggregate_counterparty_groups(np.zeros(4, dtype=np.intp), np.zeros(4), scores, np.zeros(4, dtype=np.uint8), flags, flags, 1)
+print(sum(_aggregate_counterparty_groups.stats.cache_misses.values()))
+"""
+
+def test_kernel_cache():
+    """Check that a fresh process loads the fused aggregation kernel from Numba's cache"""
+    if not NUMBA_AVAILABLE:
+        print("\n⏭️  Numba not installed, kernel cache check skipped")
+        return
+    
+    # The first process compiles and caches the kernel if needed; the second must not compile
+    for _ in range(2):
+        probe = subprocess.run([sys.executable, '-c', KERNEL_CACHE_PROBE], capture_output=True, text=True, check=True)
+    assert probe.stdout.strip() == '0', f"kernel recompiled in a new process: {probe.stdout}{probe.stderr}"
+    
+    print("\n✅ Fused aggregation kernel loaded from cache in a new process")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--csv', action='store_true', help='also save the processed test data as CSV')
+    parser.add_argument('--compare', action='store_true', help='also compare the original and high-risk scenarios')
+    parser.add_argument('--fast', action='store_true', help='derive risk fields with the fused Numba kernel')
+    parser.add_argument('--check-kernel-cache', action='store_true',
+                        help='check that the fused aggregation kernel is reused from the disk cache')
+    args = parser.parse_args()
+    
     # Run high-risk scenario test
-    test_results = test_high_risk_scenarios()
+    test_results = test_high_risk_scenarios(write_csv=args.csv, fast=args.fast)
+    
+    # Edge case: no trades at all
+    test_empty_portfolio()
+    
+    if args.check_kernel_cache:
+        test_kernel_cache()
     
-    # Compare scenarios
-    compare_scenarios()
+    # Compare scenarios; only printed, so skipped unless asked for
+    if args.compare:
+        compare_scenarios(fast=args.fast)
     
     print(f"\n🎯 Test completed successfully!")